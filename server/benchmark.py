@@ -0,0 +1,77 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Reports compression ratio and throughput of DataFrame codecs, measured on
+    eeg data of exported files or on a synthetic signal.
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from server import exporter
+
+
+def synthetic_eeg(duration=600, fs=256, channels=5):
+    """Generate random walk signal resembling raw Muse eeg, in microvolts."""
+    steps = np.random.normal(0.0, 2.0, (int(duration * fs), channels))
+    return (800.0 + np.cumsum(steps, axis=0)).astype(np.float32)
+
+
+def benchmark(eeg_data, codec, repeat=3):
+    """Measure codec on eeg data, returns dictionary with compression ratio,
+    encoding and decoding throughput in MB/s and maximum absolute error.
+    """
+    eeg_data = np.asarray(eeg_data, "<f4")
+    megabytes = eeg_data.nbytes / 1e6
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        content, params = exporter.encode_block(eeg_data, codec)
+    encoding_time = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decoded = exporter.decode_block(
+            content, eeg_data.dtype, eeg_data.shape, codec, params
+        )
+    decoding_time = (time.perf_counter() - start) / repeat
+
+    return {
+        "ratio": eeg_data.nbytes / max(len(content), 1),
+        "encoding": megabytes / max(encoding_time, 1e-9),
+        "decoding": megabytes / max(decoding_time, 1e-9),
+        "error": float(np.abs(decoded - eeg_data).max()) if eeg_data.size else 0.0,
+    }
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", help="exported files, synthetic if none")
+    parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+
+    if args.paths:
+        eeg_data = np.concatenate(
+            [
+                np.asarray(exporter.DataFrame.load(path, lazy=True).eeg_data)
+                for path in args.paths
+            ]
+        )
+    else:
+        eeg_data = synthetic_eeg()
+
+    print(f"{eeg_data.shape[0]} samples, {eeg_data.shape[1]} channels")
+    print(f"{'codec':<12}{'ratio':>8}{'enc MB/s':>12}{'dec MB/s':>12}{'max error':>12}")
+    for codec in exporter.CODECS[1:]:
+        result = benchmark(eeg_data, codec, args.repeat)
+        print(
+            f"{codec:<12}{result['ratio']:>8.2f}{result['encoding']:>12.1f}"
+            f"{result['decoding']:>12.1f}{result['error']:>12.4g}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Preallocated sample storage used by the data collector.
+"""
+
+import os
+import json
+from multiprocessing import shared_memory
+
+import numpy
+
+
+def find_gaps(timestamps, sampling_rate, tolerance=5):
+    """Find gaps in recorded samples, where interval between consecutive
+    timestamps is longer than tolerance sampling periods. Returns list of
+    dictionaries with timestamps of samples surrounding the gap, index of the
+    first sample after the gap and estimated number of missing samples.
+    """
+    timestamps = numpy.asarray(timestamps)
+    intervals = numpy.diff(timestamps)
+    gaps = []
+    for index in numpy.flatnonzero(intervals > tolerance / sampling_rate):
+        gaps.append(
+            {
+                "start": float(timestamps[index]),
+                "end": float(timestamps[index + 1]),
+                "index": int(index + 1),
+                "missing": int(round(intervals[index] * sampling_rate)) - 1,
+            }
+        )
+    return gaps
+
+
+class RingBuffer:
+    """Fixed capacity ring buffer for multichannel samples and their timestamps.
+
+    Samples are addressed by absolute indices, counted from the first sample
+    ever written. Storage is mirrored (every sample is written twice, size
+    samples apart), so any window of retained samples is a contiguous view.
+    """
+
+    def __init__(self, capacity, channels, dtype=numpy.float32, reserve_size=0):
+        """Allocate storage for capacity samples with given number of channels.
+        reserve_size: maximum number of samples reserved at once, see reserve(),
+            storage is extended by it so reserving never drops retained samples.
+        """
+        self.capacity = capacity
+        self.channels = channels
+        self.size = capacity + reserve_size
+        self.data = numpy.zeros((2 * self.size, channels), dtype=dtype)
+        self.timestamps = numpy.zeros(2 * self.size, dtype=numpy.float64)
+        self.written = 0
+        self.start = 0
+
+    def __len__(self):
+        """Return number of retained samples."""
+        return self.written - self.first_index()
+
+    def first_index(self):
+        """Return absolute index of the oldest retained sample."""
+        return max(self.start, self.written - self.capacity)
+
+    def clear(self):
+        """Drop retained samples without reallocating storage."""
+        self.start = self.written
+
+    def write(self, samples, timestamps):
+        """Append a chunk of samples, overwriting the oldest ones if full."""
+        samples = numpy.asarray(samples, dtype=self.data.dtype)
+        timestamps = numpy.asarray(timestamps, dtype=numpy.float64)
+        count = len(timestamps)
+        if count == 0:
+            return
+
+        if count > self.capacity:
+            self.written += count - self.capacity
+            samples = samples[-self.capacity :]
+            timestamps = timestamps[-self.capacity :]
+            count = self.capacity
+
+        position = self.written % self.size
+        head = min(count, self.size - position)
+        self._store(position, samples[:head], timestamps[:head])
+        if head < count:
+            self._store(0, samples[head:], timestamps[head:])
+        self.written += count
+
+    def reserve(self, max_samples):
+        """Return writable view where up to max_samples next samples can be
+        placed directly, e.g. by an LSL inlet. Samples that will be overwritten
+        are dropped from the buffer, which happens only if more than reserve_size
+        samples are reserved. Call commit() once the view is filled.
+        """
+        position = self.written % self.size
+        count = min(max_samples, self.size - position)
+        self.start = max(self.start, self.written + count - self.size)
+        return self.data[position : position + count]
+
+    def commit(self, timestamps):
+        """Publish samples placed in the view returned by reserve()."""
+        count = len(timestamps)
+        if count == 0:
+            return
+
+        position = self.written % self.size
+        mirror = position + self.size
+        self.data[mirror : mirror + count] = self.data[position : position + count]
+        self.timestamps[position : position + count] = timestamps
+        self.timestamps[mirror : mirror + count] = timestamps
+        self.written += count
+
+    def view(self, start, end):
+        """Return (data, timestamps) views for absolute index range [start; end)."""
+        start = max(start, self.first_index())
+        end = min(end, self.written)
+        if end <= start:
+            return self.data[:0], self.timestamps[:0]
+
+        position = start % self.size
+        stop = position + end - start
+        return self.data[position:stop], self.timestamps[position:stop]
+
+    def read(self, start=None, end=None):
+        """Return (data, timestamps) copies for absolute index range,
+        by default all retained samples.
+        """
+        start = self.first_index() if start is None else start
+        end = self.written if end is None else end
+        data, timestamps = self.view(start, end)
+        return data.copy(), timestamps.copy()
+
+    def search(self, timestamp, side="left"):
+        """Return absolute index at which timestamp would be inserted,
+        found by binary search over retained, sorted timestamps.
+        """
+        timestamps = self.get_timestamps()
+        return self.first_index() + int(numpy.searchsorted(timestamps, timestamp, side))
+
+    def get_data(self):
+        """Return contiguous view of all retained samples."""
+        return self.view(self.first_index(), self.written)[0]
+
+    def get_timestamps(self):
+        """Return contiguous view of all retained timestamps."""
+        return self.view(self.first_index(), self.written)[1]
+
+    def flush(self):
+        """Nothing to flush for in-memory storage."""
+
+    def _store(self, position, samples, timestamps):
+        """Copy samples into primary and mirrored storage at given position."""
+        count = len(timestamps)
+        mirror = position + self.size
+        self.data[position : position + count] = samples
+        self.data[mirror : mirror + count] = samples
+        self.timestamps[position : position + count] = timestamps
+        self.timestamps[mirror : mirror + count] = timestamps
+
+
+class SharedRingBuffer(RingBuffer):
+    """Ring buffer placed in shared memory, written by a single process and
+    read by others without locks.
+
+    Shared header holds two counters: number of published samples, and number
+    of samples the writer has started to store. Readers copy a window and then
+    check that the writer has not started to overwrite it in the meantime.
+    """
+
+    HEADER_SIZE = 64
+
+    def __init__(
+        self, capacity, channels, name=None, dtype=numpy.float32, reserve_size=0
+    ):
+        """Create shared buffer, or attach to existing one if name is given.
+        Arguments other than name must be the same in all processes.
+        """
+        dtype = numpy.dtype(dtype)
+        self.capacity = capacity
+        self.channels = channels
+        self.size = capacity + reserve_size
+        self.start = 0
+
+        data_size = 2 * self.size * channels * dtype.itemsize
+        memory_size = self.HEADER_SIZE + data_size + 2 * self.size * 8
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=memory_size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+
+        self.header = numpy.ndarray(2, numpy.int64, self.memory.buf)
+        self.data = numpy.ndarray(
+            (2 * self.size, channels), dtype, self.memory.buf, self.HEADER_SIZE
+        )
+        self.timestamps = numpy.ndarray(
+            2 * self.size, numpy.float64, self.memory.buf, self.HEADER_SIZE + data_size
+        )
+
+    @property
+    def name(self):
+        """Name used to attach to the buffer from other processes."""
+        return self.memory.name
+
+    @property
+    def written(self):
+        """Number of samples published by the writer."""
+        return int(self.header[0])
+
+    @written.setter
+    def written(self, value):
+        self.header[0] = value
+
+    def write(self, samples, timestamps):
+        """Append a chunk of samples, announcing overwritten range first."""
+        self.header[1] = self.written + len(timestamps)
+        super().write(samples, timestamps)
+
+    def reserve(self, max_samples):
+        """Return writable view for next samples, announcing overwritten range."""
+        destination = super().reserve(max_samples)
+        self.header[1] = self.written + len(destination)
+        return destination
+
+    def is_valid(self, start):
+        """Check if samples from start index are not being overwritten."""
+        return start >= self.header[1] - self.size
+
+    def read(self, start=None, end=None):
+        """Return (data, timestamps) copies of a window that is consistent,
+        dropping samples that were overwritten while copying.
+        """
+        start = self.first_index() if start is None else start
+        end = self.written if end is None else end
+        while True:
+            # Start is clamped before copying, first_index() moves forward
+            # if the writer wraps past it during the copy.
+            start = max(start, self.first_index())
+            data, timestamps = super().read(start, end)
+            if self.is_valid(start):
+                return data, timestamps
+            start = int(self.header[1]) - self.size
+
+    def close(self):
+        """Detach from shared memory."""
+        self.header = self.data = self.timestamps = None
+        self.memory.close()
+
+    def unlink(self):
+        """Remove shared memory, it is released once all processes detach."""
+        self.memory.unlink()
+
+
+class MappedBuffer:
+    """Unbounded sample storage backed by memory mapped files.
+
+    Samples and timestamps are appended to raw files in given directory, which
+    grow in fixed size extents. Only pages that are accessed are kept in memory,
+    and samples written so far remain on disk if the process crashes.
+    Interface is the same as in RingBuffer.
+    """
+
+    HEADER_FILE = "header.json"
+    DATA_FILE = "samples.raw"
+    TIMESTAMPS_FILE = "timestamps.raw"
+
+    # Number of samples the files grow by, 5 minutes of 256 Hz signal.
+    DEFAULT_EXTENT = 256 * 60 * 5
+
+    def __init__(
+        self, directory, channels, extent=DEFAULT_EXTENT, dtype=numpy.float32
+    ):
+        """Create new storage files in directory."""
+        self.directory = directory
+        self.channels = channels
+        self.extent = extent
+        self.dtype = numpy.dtype(dtype)
+        self.allocated = 0
+        self.written = 0
+        self.start = 0
+        self.data = None
+        self.timestamps = None
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for name in (self.DATA_FILE, self.TIMESTAMPS_FILE):
+            with open(self._path(name), "wb"):
+                pass
+        self._save_header()
+        self._map(extent)
+
+    @classmethod
+    def open(cls, directory):
+        """Open previously recorded storage, e.g. after a crash."""
+        path = os.path.join(directory, cls.HEADER_FILE)
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+
+        buffer = cls.__new__(cls)
+        buffer.directory = directory
+        buffer.channels = header["channels"]
+        buffer.extent = header["extent"]
+        buffer.dtype = numpy.dtype(header["dtype"])
+        buffer.start = 0
+        size = os.path.getsize(buffer._path(cls.TIMESTAMPS_FILE)) // 8
+        buffer._map(size, resize=False)
+
+        # Samples flushed after the last header update are recognized by
+        # their non-zero timestamps.
+        recorded = numpy.flatnonzero(buffer.timestamps)
+        last = recorded[-1] + 1 if len(recorded) else 0
+        buffer.written = max(header["written"], int(last))
+        return buffer
+
+    def __len__(self):
+        """Return number of retained samples."""
+        return self.written - self.start
+
+    def first_index(self):
+        """Return absolute index of the oldest retained sample."""
+        return self.start
+
+    def clear(self):
+        """Drop retained samples, they stay in the files."""
+        self.start = self.written
+
+    def write(self, samples, timestamps):
+        """Append a chunk of samples."""
+        count = len(timestamps)
+        if count == 0:
+            return
+        self._ensure(count)
+        self.data[self.written : self.written + count] = samples
+        self.timestamps[self.written : self.written + count] = timestamps
+        self.written += count
+
+    def reserve(self, max_samples):
+        """Return writable view where up to max_samples next samples can be placed."""
+        self._ensure(max_samples)
+        return self.data[self.written : self.written + max_samples]
+
+    def commit(self, timestamps):
+        """Publish samples placed in the view returned by reserve()."""
+        count = len(timestamps)
+        self.timestamps[self.written : self.written + count] = timestamps
+        self.written += count
+
+    def view(self, start, end):
+        """Return (data, timestamps) memmap views for absolute index range."""
+        start = max(start, self.start)
+        end = max(start, min(end, self.written))
+        return self.data[start:end], self.timestamps[start:end]
+
+    def read(self, start=None, end=None):
+        """Return (data, timestamps) copies for absolute index range."""
+        start = self.start if start is None else start
+        end = self.written if end is None else end
+        data, timestamps = self.view(start, end)
+        return numpy.array(data), numpy.array(timestamps)
+
+    def search(self, timestamp, side="left"):
+        """Return absolute index at which timestamp would be inserted."""
+        timestamps = self.get_timestamps()
+        return self.start + int(numpy.searchsorted(timestamps, timestamp, side))
+
+    def get_data(self):
+        """Return memmap view of all retained samples."""
+        return self.data[self.start : self.written]
+
+    def get_timestamps(self):
+        """Return memmap view of all retained timestamps."""
+        return self.timestamps[self.start : self.written]
+
+    def flush(self):
+        """Write mapped pages and number of written samples to disk."""
+        self.data.flush()
+        self.timestamps.flush()
+        self._save_header()
+
+    def _ensure(self, count):
+        """Grow files by whole extents so that count more samples fit."""
+        required = self.written + count
+        if required > self.allocated:
+            extents = -(-(required - self.allocated) // self.extent)
+            self._map(self.allocated + extents * self.extent)
+
+    def _map(self, size, resize=True):
+        """Resize files to hold size samples and map them into memory."""
+        data_path = self._path(self.DATA_FILE)
+        timestamps_path = self._path(self.TIMESTAMPS_FILE)
+        if resize:
+            os.truncate(data_path, size * self.channels * self.dtype.itemsize)
+            os.truncate(timestamps_path, size * 8)
+        self.allocated = size
+        shape = (size, self.channels)
+        self.data = numpy.memmap(data_path, self.dtype, mode="r+", shape=shape)
+        self.timestamps = numpy.memmap(
+            timestamps_path, numpy.float64, mode="r+", shape=size
+        )
+
+    def _save_header(self):
+        """Store storage layout and number of written samples."""
+        header = {
+            "channels": self.channels,
+            "dtype": self.dtype.str,
+            "extent": self.extent,
+            "written": self.written,
+        }
+        with open(self._path(self.HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f)
+
+    def _path(self, name):
+        """Return path of a storage file."""
+        return os.path.join(self.directory, name)
@@ -0,0 +1,225 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    SQLite index of exported DataFrames, answering dataset queries without
+    reading the recordings.
+"""
+
+import os
+import pickle
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+
+CATALOG_FILE = "catalog.sqlite"
+
+# Extensions of files indexed when catalog is rebuilt, see exporter.FORMATS.
+EXTENSIONS = (".json", ".bin")
+
+COLUMNS = (
+    "path",
+    "userid",
+    "deviceid",
+    "label",
+    "uri",
+    "song",
+    "artist",
+    "album",
+    "start",
+    "end",
+    "labeling",
+    "samples",
+    "channels",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    userid TEXT,
+    deviceid TEXT,
+    label TEXT,
+    uri TEXT,
+    song TEXT,
+    artist TEXT,
+    album TEXT,
+    start TEXT,
+    end TEXT,
+    labeling TEXT,
+    samples INTEGER,
+    channels INTEGER
+);
+CREATE INDEX IF NOT EXISTS recordings_label ON recordings (label);
+CREATE INDEX IF NOT EXISTS recordings_userid ON recordings (userid);
+CREATE INDEX IF NOT EXISTS recordings_start ON recordings (start);
+"""
+
+INSERT = (
+    f"INSERT OR REPLACE INTO recordings ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(COLUMNS))})"
+)
+
+# Errors of loading a DataFrame file that is not valid.
+LOAD_ERRORS = (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError)
+
+
+def _isoformat(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp.isoformat()
+    return timestamp
+
+
+class Catalog:
+    """Catalog of DataFrames stored in a directory, with one row per file.
+    Paths are stored relative to the directory, so it can be moved.
+    """
+
+    def __init__(self, directory):
+        """Open or create catalog in given directory."""
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.path = os.path.join(directory, CATALOG_FILE)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close database connection."""
+        self.connection.close()
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.directory))
+
+    def _row(self, path, data_frame):
+        """Return row describing DataFrame saved to path."""
+        playback = data_frame.playback_info or {}
+        timestamps = data_frame.timestamps or {}
+        shape = data_frame.get_eeg_shape()
+        return (
+            self._relative(path),
+            None if data_frame.userid is None else str(data_frame.userid),
+            data_frame.deviceid,
+            data_frame.label,
+            playback.get("uri"),
+            playback.get("song"),
+            playback.get("artists"),
+            playback.get("album"),
+            _isoformat(timestamps.get("start")),
+            _isoformat(timestamps.get("end")),
+            _isoformat(timestamps.get("labeling")),
+            shape[0] if len(shape) > 0 else 0,
+            shape[1] if len(shape) > 1 else 1,
+        )
+
+    def add(self, path, data_frame):
+        """Add or update row describing DataFrame saved to path."""
+        row = self._row(path, data_frame)
+        with self.lock, self.connection:
+            self.connection.execute(INSERT, row)
+
+    def remove(self, path):
+        """Remove row of the file at path."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM recordings WHERE path = ?", (self._relative(path),)
+            )
+
+    def query(self, **filters):
+        """Return rows as dictionaries, filtered by equality of column values,
+        e.g. query(label="like", userid="0"), ordered by start time.
+        Paths in returned rows are joined with catalog directory.
+        """
+        unknown = set(filters) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown catalog columns: {sorted(unknown)}.")
+
+        sql = "SELECT * FROM recordings"
+        if filters:
+            sql += " WHERE " + " AND ".join(f"{column} = ?" for column in filters)
+        sql += " ORDER BY start"
+        with self.lock:
+            rows = self.connection.execute(sql, tuple(filters.values())).fetchall()
+
+        rows = [dict(row) for row in rows]
+        for row in rows:
+            row["path"] = os.path.join(self.directory, row["path"])
+        return rows
+
+    def count(self, column="label"):
+        """Return dictionary with number of recordings for each column value."""
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown catalog column: {column}.")
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {column}, COUNT(*) FROM recordings GROUP BY {column}"
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def __len__(self):
+        """Return number of indexed recordings."""
+        with self.lock:
+            row = self.connection.execute("SELECT COUNT(*) FROM recordings").fetchone()
+        return row[0]
+
+    def rebuild(self, load):
+        """Index all DataFrame files in the directory in a single transaction,
+        dropping rows of files that no longer exist. Files that fail to load
+        are skipped, returns list of (path, error) pairs for them.
+        load: function loading DataFrame from a path, preferably lazily.
+        """
+        rows, skipped = [], []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path) or not name.endswith(EXTENSIONS):
+                continue
+            try:
+                rows.append(self._row(path, load(path)))
+            except LOAD_ERRORS as error:
+                skipped.append((path, error))
+
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM recordings")
+            self.connection.executemany(INSERT, rows)
+        return skipped
+
+
+def main():
+    """Run catalog command."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["rebuild", "labels", "list"])
+    parser.add_argument("directory")
+    parser.add_argument("--label")
+    parser.add_argument("--userid")
+
+    args = parser.parse_args()
+    catalog = Catalog(args.directory)
+
+    if args.command == "rebuild":
+        from server import exporter
+
+        skipped = catalog.rebuild(
+            lambda path: exporter.DataFrame.load(path, lazy=True)
+        )
+        for path, error in skipped:
+            print(f"Skipped {path}: {error}")
+        print(f"Indexed {len(catalog)} recordings.")
+    elif args.command == "labels":
+        for label, count in catalog.count("label").items():
+            print(f"{label}: {count}")
+    else:
+        filters = {}
+        if args.label is not None:
+            filters["label"] = args.label
+        if args.userid is not None:
+            filters["userid"] = args.userid
+        for row in catalog.query(**filters):
+            print(f"{row['path']} {row['label']} {row['artist']} - {row['song']}")
+
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,15 @@ import os
 import sys
 
 from server.logger import logger
+from server import filters
 import server.secret
 
 
 CONFIGURATION_DIR = "configs"
 
+# Id of the single configured Muse device, used when it has no name.
+DEFAULT_DEVICE_ID = "muse"
+
 spotify = None
 muse = None
 app = None
@@ -117,6 +121,8 @@ class Muse:
     def __init__(self):
         self.set_name(None)
         self.set_address(None)
+        self.set_sensors([])
+        self.set_devices({})
 
     def get_name(self):
         return self.name
@@ -130,6 +136,21 @@ class Muse:
     def set_address(self, new_address):
         self.address = new_address
 
+    def get_devices(self):
+        """Return {device_id: address} map, by default the single configured device."""
+        if not self.devices:
+            return {self.get_name() or DEFAULT_DEVICE_ID: self.get_address()}
+        return self.devices
+
+    def set_devices(self, new_devices):
+        self.devices = new_devices
+
+    def get_sensors(self):
+        return self.sensors
+
+    def set_sensors(self, new_sensors):
+        self.sensors = new_sensors
+
     @classmethod
     def load(cls, filename):
         """Load Muse config from JSON file"""
@@ -138,6 +159,8 @@ class Muse:
             config = cls()
             config.set_name(data["name"])
             config.set_address(data["address"])
+            config.set_sensors(data.get("sensors", []))
+            config.set_devices(data.get("devices", {}))
             return config
 
     def save(self, filename):
@@ -146,6 +169,8 @@ class Muse:
             data = {
                 "name": self.get_name(),
                 "address": self.get_address(),
+                "sensors": self.get_sensors(),
+                "devices": self.devices,
             }
             json.dump(data, f)
 
@@ -154,6 +179,15 @@ class App:
     def __init__(self):
         self.set_labels_to_playlists_map(None)
         self.set_session_data_dir(None)
+        self.set_continuous_recording(False)
+        self.set_mapped_storage(False)
+        self.set_collector_process(False)
+        self.set_export_format("json")
+        self.set_export_queue_size(8)
+        self.set_export_codec("none")
+        self.set_journal_interval(5.0)
+        self.set_catalog(True)
+        self.set_feature_hop(0.25)
 
     def get_labels_to_playlists_map(self):
         return self.labels_to_playlists_map
@@ -167,6 +201,60 @@ class App:
     def set_session_data_dir(self, new_dir):
         self.session_data_dir = new_dir
 
+    def get_continuous_recording(self):
+        return self.continuous_recording
+
+    def set_continuous_recording(self, enabled):
+        self.continuous_recording = enabled
+
+    def get_mapped_storage(self):
+        return self.mapped_storage
+
+    def set_mapped_storage(self, enabled):
+        self.mapped_storage = enabled
+
+    def get_collector_process(self):
+        return self.collector_process
+
+    def set_collector_process(self, enabled):
+        self.collector_process = enabled
+
+    def get_export_format(self):
+        return self.export_format
+
+    def set_export_format(self, new_format):
+        self.export_format = new_format
+
+    def get_export_codec(self):
+        return self.export_codec
+
+    def set_export_codec(self, codec):
+        self.export_codec = codec
+
+    def get_export_queue_size(self):
+        return self.export_queue_size
+
+    def set_export_queue_size(self, size):
+        self.export_queue_size = size
+
+    def get_catalog(self):
+        return self.catalog
+
+    def set_catalog(self, enabled):
+        self.catalog = enabled
+
+    def get_feature_hop(self):
+        return self.feature_hop
+
+    def set_feature_hop(self, hop):
+        self.feature_hop = hop
+
+    def get_journal_interval(self):
+        return self.journal_interval
+
+    def set_journal_interval(self, interval):
+        self.journal_interval = interval
+
     @classmethod
     def load(cls, filename):
         """Load App config from JSON file"""
@@ -175,6 +263,15 @@ class App:
             config = cls()
             config.set_labels_to_playlists_map(data["labels_to_playlists_map"])
             config.set_session_data_dir(data["session_data_dir"])
+            config.set_continuous_recording(data.get("continuous_recording", False))
+            config.set_mapped_storage(data.get("mapped_storage", False))
+            config.set_collector_process(data.get("collector_process", False))
+            config.set_export_format(data.get("export_format", "json"))
+            config.set_export_codec(data.get("export_codec", "none"))
+            config.set_export_queue_size(data.get("export_queue_size", 8))
+            config.set_journal_interval(data.get("journal_interval", 5.0))
+            config.set_catalog(data.get("catalog", True))
+            config.set_feature_hop(data.get("feature_hop", 0.25))
             return config
 
     def save(self, filename):
@@ -183,6 +280,15 @@ class App:
             data = {
                 "labels_to_playlists_map": self.get_labels_to_playlists_map(),
                 "session_data_dir": self.get_session_data_dir(),
+                "continuous_recording": self.get_continuous_recording(),
+                "mapped_storage": self.get_mapped_storage(),
+                "collector_process": self.get_collector_process(),
+                "export_format": self.get_export_format(),
+                "export_codec": self.get_export_codec(),
+                "export_queue_size": self.get_export_queue_size(),
+                "journal_interval": self.get_journal_interval(),
+                "catalog": self.get_catalog(),
+                "feature_hop": self.get_feature_hop(),
             }
             json.dump(data, f)
 
@@ -223,6 +329,7 @@ def load_configuration():
     spotify = Spotify.load(_get_config_path("spotify.json"))
     muse = Muse.load(_get_config_path("muse.json"))
     app = App.load(_get_config_path("app.json"))
+    filters.set_cache_file(_get_config_path("filters.json", False))
 
 
 def get_config_view(_userid):
@@ -0,0 +1,232 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Training set builder, cutting fixed length epochs of eeg data around
+    one of the markers of every recording in a session directory.
+
+    Epochs are written to a single raw file, which is memory mapped as an
+    array of shape (epochs, channels, samples), see load().
+
+    Run from the repository root:
+    python -m server.data.dataset DIR OUTPUT [--marker labeling] [--offset -2]
+"""
+
+import os
+import csv
+import json
+import pickle
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from server import exporter
+
+
+MARKERS = ("start", "labeling", "end")
+
+HEADER_FILE = "header.json"
+DATA_FILE = "X.raw"
+LABELS_FILE = "y.npy"
+METADATA_FILE = "metadata.csv"
+
+METADATA_COLUMNS = ("file", "label", "userid", "artist", "song", "uri", "marker")
+
+# Errors of loading a DataFrame file that is not valid, such files are skipped.
+LOAD_ERRORS = (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError)
+
+
+def cut_epoch(data_frame, marker="labeling", offset=-2.0, window=4.0, fs=256):
+    """Return (channels, samples) epoch starting offset seconds after the marker,
+    or None if the recording has no such marker or is too short.
+    Eeg data is assumed to start at the start marker, when sample timestamps
+    are available they are used to locate the epoch across gaps in data.
+    """
+    timestamps = data_frame.timestamps
+    if timestamps.get(marker) is None or timestamps.get("start") is None:
+        return None
+
+    delay = (timestamps[marker] - timestamps["start"]).total_seconds() + offset
+    samples = int(round(window * fs))
+    eeg_timestamps = data_frame.eeg_timestamps
+    if eeg_timestamps is not None and len(eeg_timestamps) > 0:
+        target = eeg_timestamps[0] + delay
+        if target < eeg_timestamps[0]:
+            return None
+        first = np.searchsorted(eeg_timestamps, target)
+    else:
+        first = int(round(delay * fs))
+
+    eeg_data = np.asarray(data_frame.eeg_data, dtype=np.float32)
+    if first < 0 or first + samples > len(eeg_data):
+        return None
+    return eeg_data[first : first + samples].T
+
+
+def _write_epochs(task):
+    """Cut epochs of a batch of files and write them at their indices in the
+    output file. Returns metadata of files with an epoch, others are None,
+    and list of (path, error) pairs of files that failed to load.
+    """
+    path, shape, files, params = task
+    epochs = np.memmap(path, np.float32, mode="r+", shape=shape)
+    results = []
+    skipped = []
+    for index, filename in files:
+        try:
+            data_frame = exporter.DataFrame.load(filename, lazy=True)
+            epoch = cut_epoch(data_frame, **params)
+        except LOAD_ERRORS as error:
+            skipped.append((filename, str(error)))
+            epoch = None
+
+        if epoch is None or epoch.shape != shape[1:]:
+            results.append(None)
+            continue
+
+        epochs[index] = epoch
+        playback = data_frame.playback_info or {}
+        results.append(
+            {
+                "file": os.path.basename(filename),
+                "label": data_frame.label,
+                "userid": data_frame.userid,
+                "artist": playback.get("artists"),
+                "song": playback.get("song"),
+                "uri": playback.get("uri"),
+                "marker": data_frame.timestamps[params["marker"]].isoformat(),
+            }
+        )
+    epochs.flush()
+    return results, skipped
+
+
+def build(
+    directory,
+    output,
+    marker="labeling",
+    offset=-2.0,
+    window=4.0,
+    fs=256,
+    channels=5,
+    workers=None,
+    batch_size=32,
+):
+    """Build training set from all recordings in directory, processed in
+    parallel by a pool of workers. Returns number of epochs, and list of
+    (path, error) pairs of files that failed to load.
+    """
+    if marker not in MARKERS:
+        raise ValueError(f"Unknown marker {marker}, must be one of {MARKERS}.")
+    if not os.path.exists(output):
+        os.makedirs(output)
+
+    extensions = tuple(exporter.FORMATS.values())
+    files = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(extensions)
+    )
+    params = {"marker": marker, "offset": offset, "window": window, "fs": fs}
+    path = os.path.join(output, DATA_FILE)
+    shape = (len(files), channels, int(round(window * fs)))
+    if not files:
+        open(path, "wb").close()
+        _save_tables(output, [], shape, params)
+        return 0, []
+
+    # Every file gets a slot, slots of files without an epoch are compacted.
+    np.memmap(path, np.float32, mode="w+", shape=shape).flush()
+
+    indexed = list(enumerate(files))
+    tasks = [
+        (path, shape, indexed[start : start + batch_size], params)
+        for start in range(0, len(indexed), batch_size)
+    ]
+    results, skipped = [], []
+    with ProcessPoolExecutor(workers) as pool:
+        for batch_results, batch_skipped in pool.map(_write_epochs, tasks):
+            results += batch_results
+            skipped += batch_skipped
+
+    epochs = np.memmap(path, np.float32, mode="r+", shape=shape)
+    metadata = []
+    for index, item in enumerate(results):
+        if item is not None:
+            if index != len(metadata):
+                epochs[len(metadata)] = epochs[index]
+            metadata.append(item)
+    epochs.flush()
+    del epochs
+    with open(path, "r+b") as data_file:
+        data_file.truncate(len(metadata) * shape[1] * shape[2] * 4)
+
+    _save_tables(output, metadata, (len(metadata),) + shape[1:], params)
+    return len(metadata), skipped
+
+
+def _save_tables(output, metadata, shape, params):
+    """Save header, labels and metadata of the training set."""
+    labels = sorted({str(item["label"]) for item in metadata})
+    header = dict(params, shape=list(shape), dtype="float32", labels=labels)
+    with open(os.path.join(output, HEADER_FILE), "w", encoding="utf-8") as f:
+        json.dump(header, f)
+
+    y = np.array([labels.index(str(item["label"])) for item in metadata], np.int64)
+    np.save(os.path.join(output, LABELS_FILE), y)
+
+    with open(os.path.join(output, METADATA_FILE), "w", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, METADATA_COLUMNS)
+        writer.writeheader()
+        writer.writerows(metadata)
+
+
+def load(output):
+    """Load training set, returns header, memory mapped epochs X, label
+    indices y and list of metadata dictionaries, one per epoch.
+    Names of labels are listed in header["labels"].
+    """
+    with open(os.path.join(output, HEADER_FILE), "r", encoding="utf-8") as f:
+        header = json.load(f)
+
+    shape = tuple(header["shape"])
+    X = np.zeros(shape, header["dtype"])
+    if shape[0] > 0:
+        X = np.memmap(
+            os.path.join(output, DATA_FILE), header["dtype"], mode="r", shape=shape
+        )
+    y = np.load(os.path.join(output, LABELS_FILE))
+    with open(os.path.join(output, METADATA_FILE), "r", encoding="utf-8") as f:
+        metadata = list(csv.DictReader(f))
+    return header, X, y, metadata
+
+
+def main():
+    """Build training set."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("output")
+    parser.add_argument("--marker", choices=MARKERS, default="labeling")
+    parser.add_argument("--offset", type=float, default=-2.0, help="seconds")
+    parser.add_argument("--window", type=float, default=4.0, help="seconds")
+    parser.add_argument("--fs", type=int, default=256)
+    parser.add_argument("--channels", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    count, skipped = build(
+        args.dir,
+        args.output,
+        args.marker,
+        args.offset,
+        args.window,
+        args.fs,
+        args.channels,
+        args.workers,
+    )
+    for path, error in skipped:
+        print(f"Skipped {path}: {error}")
+    print(f"Saved {count} epochs to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Out-of-core iteration over recorded DataFrames and training set epochs.
+    Next batches are loaded by a thread pool while the current one is being
+    processed, within a memory budget.
+"""
+
+import os
+import random
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from server import exporter
+from server.data import stats
+from server.data import dataset
+
+
+# Default limit of memory used by loaded batches that were not consumed yet.
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+def prefetch(items, load, size, workers=4, max_bytes=DEFAULT_MEMORY_BUDGET):
+    """Yield load(item) for all items in order, loading following items in
+    a thread pool. Items are submitted while total size of loaded and not
+    yet yielded items, estimated with size(item), is within max_bytes.
+    """
+    items = iter(items)
+    end = object()
+    pending = deque()
+    pending_bytes = 0
+    pool = ThreadPoolExecutor(workers)
+    try:
+        item = next(items, end)
+        item_size = None if item is end else size(item)
+        while pending or item is not end:
+            while item is not end and (
+                not pending or pending_bytes + item_size <= max_bytes
+            ):
+                pending.append((pool.submit(load, item), item_size))
+                pending_bytes += item_size
+                item = next(items, end)
+                item_size = None if item is end else size(item)
+
+            future, loaded_size = pending.popleft()
+            pending_bytes -= loaded_size
+            yield future.result()
+    finally:
+        # Futures not started yet are cancelled when the generator is closed.
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _batches(items, batch_size):
+    return [
+        items[start : start + batch_size] for start in range(0, len(items), batch_size)
+    ]
+
+
+def _matches(summary, label, userid, since, until):
+    """Check if summary of a recording matches the filters."""
+    if label is not None and summary["label"] != label:
+        return False
+    if userid is not None and str(summary["userid"]) != str(userid):
+        return False
+    if since is not None or until is not None:
+        if summary["start"] is None:
+            return False
+        start = datetime.fromisoformat(summary["start"])
+        if since is not None and start < since:
+            return False
+        if until is not None and start >= until:
+            return False
+    return True
+
+
+def select(directory, label=None, userid=None, since=None, until=None):
+    """Return files of recordings in directory matching filters, which are
+    checked against metadata only.
+    since, until: datetime range of the start marker, until is excluded.
+    """
+    return [
+        summary["file"]
+        for summary in stats.summarize_all(stats.list_files(directory))
+        if "error" not in summary
+        and _matches(summary, label, userid, since, until)
+    ]
+
+
+def iterate_recordings(
+    directory,
+    batch_size=16,
+    shuffle=False,
+    seed=None,
+    workers=4,
+    max_bytes=DEFAULT_MEMORY_BUDGET,
+    **filters,
+):
+    """Yield batches (lists) of DataFrames from directory, see select() for
+    filters. Memory used by a batch is estimated from sizes of the files.
+    """
+    files = select(directory, **filters)
+    if shuffle:
+        random.Random(seed).shuffle(files)
+
+    def load(batch):
+        return [exporter.DataFrame.load(filename) for filename in batch]
+
+    def size(batch):
+        return sum(os.path.getsize(filename) for filename in batch)
+
+    yield from prefetch(_batches(files, batch_size), load, size, workers, max_bytes)
+
+
+def iterate_epochs(
+    output,
+    batch_size=64,
+    shuffle=False,
+    seed=None,
+    workers=2,
+    max_bytes=DEFAULT_MEMORY_BUDGET,
+    label=None,
+    userid=None,
+):
+    """Yield (X, y, metadata) batches of epochs from training set built with
+    dataset.build(), optionally only with given label or userid.
+    """
+    _, X, y, metadata = dataset.load(output)
+    indices = [
+        index
+        for index, item in enumerate(metadata)
+        if (label is None or item["label"] == label)
+        and (userid is None or item["userid"] == str(userid))
+    ]
+    if shuffle:
+        random.Random(seed).shuffle(indices)
+
+    def load(batch):
+        # Sorted indices read the memory mapped file sequentially.
+        batch = np.sort(batch)
+        return np.array(X[batch]), y[batch], [metadata[index] for index in batch]
+
+    def size(batch):
+        return len(batch) * X[0].nbytes
+
+    yield from prefetch(_batches(indices, batch_size), load, size, workers, max_bytes)
@@ -0,0 +1,219 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Converts recordings saved in the legacy JSON format (pickled, base64
+    encoded data) to the binary format in another directory, verifying that
+    converted files hold the same samples and metadata. Files are converted in
+    parallel, and ones already converted are skipped based on the hash of
+    their content.
+
+    Run from the repository root:
+    python -m server.data.migrate DIR OUTPUT [--codec delta-zlib]
+"""
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from server import exporter
+from server import catalog
+
+
+# Record of converted files, kept in the output directory. It's JSON, but
+# must not have the extension of DataFrame files, see exporter.FORMATS.
+MANIFEST_FILE = "migration.manifest"
+
+# Size of blocks in which files are read to compute their hash.
+READ_SIZE = 1024 * 1024
+
+
+def file_hash(filename):
+    """Return sha256 hash of file content."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as input_file:
+        for block in iter(lambda: input_file.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _tolerance(array, codec):
+    """Return maximum error of array values allowed by codec."""
+    if not codec.startswith("int16") or array.size == 0:
+        return 0.0
+    return float((array.max(axis=0) - array.min(axis=0)).max()) / 65534 + 1e-6
+
+
+def _same_samples(expected, actual, dtype, codec):
+    """Compare arrays, as they are stored with dtype and codec."""
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    expected = np.asarray(expected, dtype)
+    actual = np.asarray(actual)
+    if expected.shape != actual.shape:
+        return False
+    if expected.size == 0:
+        return True
+    return float(np.abs(expected - actual).max()) <= _tolerance(expected, codec)
+
+
+def verify(source, converted, codec="none"):
+    """Return list of differences between source and converted DataFrames.
+    Samples are compared after conversion to float32, in which they are
+    acquired from the stream, with error allowed by lossy codecs.
+    """
+    differences = []
+    for name in ("playback_info", "timestamps", "label", "userid", "gaps"):
+        if getattr(source, name) != getattr(converted, name):
+            differences.append(name)
+    if source.deviceid != converted.deviceid:
+        differences.append("deviceid")
+    if not _same_samples(source.eeg_data, converted.eeg_data, np.float32, codec):
+        differences.append("eeg_data")
+    if not _same_samples(
+        source.eeg_timestamps, converted.eeg_timestamps, np.float64, "none"
+    ):
+        differences.append("eeg_timestamps")
+
+    sensors = source.sensors or {}
+    converted_sensors = converted.sensors or {}
+    if set(sensors) != set(converted_sensors):
+        differences.append("sensors")
+    for stream_type in set(sensors) & set(converted_sensors):
+        data, timestamps = sensors[stream_type]
+        converted_data, converted_timestamps = converted_sensors[stream_type]
+        if not _same_samples(data, converted_data, np.float32, codec) or not (
+            _same_samples(timestamps, converted_timestamps, np.float64, "none")
+        ):
+            differences.append(f"sensors/{stream_type}")
+    return differences
+
+
+def convert(task):
+    """Convert a single file, returns dictionary describing the result."""
+    source, output, codec, known_hash = task
+    result = {"source": source, "output": output, "bytes": os.path.getsize(source)}
+    try:
+        result["hash"] = file_hash(source)
+        if result["hash"] == known_hash and os.path.exists(output):
+            result["status"] = "skipped"
+            return result
+
+        data_frame = exporter.DataFrame.load(source)
+        data_frame.save(output, "binary", codec)
+        differences = verify(data_frame, exporter.DataFrame.load(output), codec)
+        if differences:
+            os.remove(output)
+            result["status"] = "failed"
+            result["error"] = f"Converted file differs in {', '.join(differences)}."
+        else:
+            result["status"] = "converted"
+    except (OSError, ValueError, KeyError, EOFError, pickle.UnpicklingError) as error:
+        result["status"] = "failed"
+        result["error"] = str(error)
+    return result
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def migrate(directory, output_dir, codec="none", workers=None, index=False):
+    """Convert all legacy JSON files in directory to binary files in output_dir,
+    which must be another directory, so that recordings are not duplicated.
+    Converted files are added to the catalog of output_dir if index is True.
+    Manifest is saved after every converted file, so an interrupted migration
+    can be continued. Returns list of results, see convert().
+    """
+    if not os.path.isdir(directory):
+        raise ValueError(f"{directory} is not a directory.")
+    if os.path.realpath(output_dir) == os.path.realpath(directory):
+        raise ValueError("Output directory must differ from the source directory.")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    manifest = _load_manifest(output_dir)
+
+    tasks = []
+    for name in sorted(os.listdir(directory)):
+        source = os.path.join(directory, name)
+        if not name.endswith(exporter.FORMATS["json"]):
+            continue
+        output = os.path.splitext(name)[0] + exporter.FORMATS["binary"]
+        known_hash = None
+        if manifest.get(name, {}).get("codec") == codec:
+            known_hash = manifest[name]["hash"]
+        tasks.append((source, os.path.join(output_dir, output), codec, known_hash))
+
+    results = []
+    recordings = None
+    if index:
+        recordings = catalog.Catalog(output_dir)
+    with ProcessPoolExecutor(workers) as pool:
+        for result in pool.map(convert, tasks):
+            results.append(result)
+            if result["status"] != "converted":
+                continue
+            name = os.path.basename(result["source"])
+            manifest[name] = {
+                "hash": result["hash"],
+                "output": os.path.basename(result["output"]),
+                "codec": codec,
+            }
+            _save_manifest(output_dir, manifest)
+            if recordings is not None:
+                output = result["output"]
+                recordings.add(output, exporter.DataFrame.load(output, lazy=True))
+
+    if recordings is not None:
+        recordings.close()
+    return results
+
+
+def main():
+    """Run migration."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir")
+    parser.add_argument("output")
+    parser.add_argument("--codec", choices=exporter.CODECS, default="none")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--catalog", action="store_true", help="index converted files")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = migrate(args.dir, args.output, args.codec, args.workers, args.catalog)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    for result in results:
+        if result["status"] == "failed":
+            print(f"Failed {result['source']}: {result['error']}")
+
+    statuses = [result["status"] for result in results]
+    converted = [result for result in results if result["status"] == "converted"]
+    megabytes = sum(result["bytes"] for result in converted) / 1e6
+    print(
+        f"Converted {len(converted)}, skipped {statuses.count('skipped')}, "
+        f"failed {statuses.count('failed')} files in {elapsed:.1f} s."
+    )
+    print(
+        f"Throughput: {megabytes / elapsed:.1f} MB/s, "
+        f"{len(converted) / elapsed:.1f} files/s."
+    )
+
+
+if __name__ == "__main__":
+    main()
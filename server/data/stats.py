@@ -1,46 +1,121 @@
-import sys
+""" 2021 Created by michal@buyuk-dev.com
+
+    Dataset report with label, user and artist counts, recorded duration and
+    number of samples of exported DataFrames. Only metadata is read, files
+    are scanned in parallel.
+
+    Run from the repository root: python -m server.data.stats [dir]
+"""
+
 import os
-import json
 import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from server import exporter
 
 
-# List all files in the current directory
 def list_files(path):
-    files = []
-    for name in os.listdir(path):
-        if os.path.isfile(os.path.join(path, name)):
-            files.append(name)
-    return files
-
-
-# For each file in current directory, check if it is a json file and load "label" entry from it.
-def load_labels(path):
-    labels = []
-    files = list_files(path)
-    for file in files:
-        if file.endswith(".json"):
-            with open(os.path.join(path, file)) as json_file:
-                data = json.load(json_file)
-                labels.append(data["label"])
-    return labels
-
-
-# Print counts for each label
-def print_counts(labels):
-    counts = {}
-    for label in labels:
-        if label in counts:
-            counts[label] += 1
+    """List DataFrame files in directory."""
+    extensions = tuple(exporter.FORMATS.values())
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if name.endswith(extensions) and os.path.isfile(os.path.join(path, name))
+    )
+
+
+def summarize(filename):
+    """Read metadata of a single DataFrame file, and return dictionary with
+    its label, userid, artist, start time, duration in seconds and number of
+    samples.
+    Samples are None if they can't be determined without reading eeg data.
+    """
+    try:
+        if exporter.is_binary(filename):
+            metadata, _ = exporter.read_header(filename)
+            shape = next(
+                block["shape"]
+                for block in metadata["blocks"]
+                if block["name"] == "eeg"
+            )
         else:
-            counts[label] = 1
-    for label in counts:
-        print(label + ": " + str(counts[label]))
+            metadata = exporter.read_json_metadata(filename)
+            shape = metadata.get("eeg_shape")
+    except (OSError, ValueError, KeyError, StopIteration) as error:
+        return {"file": filename, "error": str(error)}
+
+    duration = 0.0
+    timestamps = metadata.get("timestamps") or {}
+    if timestamps.get("start") and timestamps.get("end"):
+        start = datetime.fromisoformat(timestamps["start"])
+        end = datetime.fromisoformat(timestamps["end"])
+        duration = (end - start).total_seconds()
+
+    return {
+        "file": filename,
+        "label": metadata.get("label"),
+        "userid": metadata.get("userid"),
+        "artist": (metadata.get("playback") or {}).get("artists"),
+        "start": timestamps.get("start"),
+        "duration": duration,
+        "samples": shape[0] if shape else None,
+    }
+
+
+def summarize_all(files, workers=None):
+    """Summarize files using a process pool."""
+    chunksize = max(1, len(files) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(summarize, files, chunksize=chunksize))
+
+
+def report(path, workers=None):
+    """Summarize all DataFrame files in directory, returns dictionary with
+    aggregated statistics.
+    """
+    summaries = summarize_all(list_files(path), workers)
+    errors = [summary for summary in summaries if "error" in summary]
+    summaries = [summary for summary in summaries if "error" not in summary]
+    samples = [summary["samples"] for summary in summaries]
+    return {
+        "files": len(summaries),
+        "labels": Counter(summary["label"] for summary in summaries),
+        "users": Counter(summary["userid"] for summary in summaries),
+        "artists": Counter(summary["artist"] for summary in summaries),
+        "duration": sum(summary["duration"] for summary in summaries),
+        "samples": sum(count for count in samples if count is not None),
+        "unknown_samples": samples.count(None),
+        "errors": errors,
+    }
+
+
+def print_counts(title, counts):
+    """Print counts in descending order."""
+    print(f"{title}:")
+    for key, count in counts.most_common():
+        print(f"    {key}: {count}")
+
+
+def print_report(stats):
+    """Print dataset report."""
+    print(f"Recordings: {stats['files']}")
+    print(f"Duration: {stats['duration'] / 3600:.2f} h")
+    print(f"Samples: {stats['samples']}")
+    if stats["unknown_samples"]:
+        print(f"    not counted in {stats['unknown_samples']} older json files")
+    print_counts("Labels", stats["labels"])
+    print_counts("Users", stats["users"])
+    print_counts("Artists", stats["artists"])
+    for error in stats["errors"]:
+        print(f"Skipped {error['file']}: {error['error']}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("dir", nargs="?", default=".")
+    parser.add_argument("--workers", type=int, default=None)
     args = parser.parse_args()
 
-    labels = load_labels(args.dir)
-    print_counts(labels)
+    print_report(report(args.dir, args.workers))
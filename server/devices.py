@@ -0,0 +1,170 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Registry of Muse devices handled by the server, each one with its own
+    LSL stream, data collector and session.
+"""
+
+import os
+from datetime import datetime
+
+from server.logger import logger
+from server import configuration
+
+from server import muse
+from server import session
+from server import features
+
+
+class Device:
+    """Muse headset together with objects collecting and processing its data."""
+
+    def __init__(self, device_id, address, sensors=()):
+        """Initialize device, nothing is connected yet."""
+        self.device_id = device_id
+        self.address = address
+        self.sensors = sensors
+        self.stream = None
+        self.collector = None
+        self.features = None
+        self.session = None
+
+    def is_streaming(self):
+        """Check if LSL stream for this device is running."""
+        return self.stream is not None and self.stream.is_running()
+
+    def is_collecting(self):
+        """Check if data is being collected from this device."""
+        return self.collector is not None and self.collector.is_running()
+
+    def is_connecting(self):
+        """Check if LSL stream for this device is being connected."""
+        return self.stream is not None and self.stream.is_connecting()
+
+    def connect(self, wait=True):
+        """Start LSL stream for this device, see muse.Stream.start()."""
+        if self.stream is None:
+            self.stream = muse.Stream(self.address, self.sensors)
+        return self.stream.start(wait)
+
+    def disconnect(self):
+        """Stop session, data collection and LSL stream for this device."""
+        if self.session is not None:
+            self.stop_session()
+        if self.collector is not None:
+            self.stop_collector()
+        self.stream.stop()
+        self.stream = None
+
+    def start_collector(self, in_process=False):
+        """Start collecting data from the stream.
+        in_process: run collector in a separate process.
+        """
+        if self.collector is None and in_process:
+            self.collector = muse.ProcessDataCollector(self.stream)
+
+        if self.collector is None:
+            storage_dir = None
+            if configuration.app.get_mapped_storage():
+                storage_dir = os.path.join(
+                    configuration.app.get_session_data_dir(),
+                    f"{datetime.now()}-{self.device_id}.raw",
+                )
+                logger.info(f"Recording samples to {storage_dir}.")
+            self.collector = muse.DataCollector(self.stream, storage_dir=storage_dir)
+
+        self.collector.start()
+
+        hop = configuration.app.get_feature_hop()
+        if hop:
+            engine = features.BandPowerEngine(
+                self.stream.get_sampling_rate(),
+                self.stream.get_channels_count(),
+                hop=hop,
+            )
+            self.features = features.FeatureStage(self.collector, engine)
+            self.features.start()
+
+    def stop_collector(self):
+        """Stop collecting data."""
+        if self.features is not None:
+            self.features.stop()
+            self.features = None
+        self.collector.stop()
+        self.collector = None
+
+    def get_features(self):
+        """Return the latest band power feature, or None if there is none."""
+        if self.features is None or self.features.engine.latest is None:
+            return None
+        engine = self.features.engine
+        return {
+            "bands": engine.get_band_names(),
+            "timestamp": engine.latest["timestamp"],
+            "power": engine.latest["power"].tolist(),
+            "artifact": engine.latest["artifact"].tolist(),
+        }
+
+    def start_session(self):
+        """Start a new session recording data of this device."""
+        self.session = session.Session(
+            self.collector,
+            continuous=configuration.app.get_continuous_recording(),
+            device_id=self.device_id,
+        )
+        self.session.start()
+
+    def stop_session(self):
+        """Stop the session, waiting until its data is exported."""
+        self.session.stop()
+        self.session = None
+
+    def get_status(self):
+        """Return stream and collector status."""
+        return {
+            "connecting": self.is_connecting(),
+            "stream": self.is_streaming(),
+            "collector": self.is_collecting(),
+        }
+
+
+class DeviceRegistry:
+    """Devices handled by the server, keyed by device id."""
+
+    def __init__(self):
+        """Initialize empty registry."""
+        self.devices = {}
+
+    def __len__(self):
+        """Return number of registered devices."""
+        return len(self.devices)
+
+    def __iter__(self):
+        """Iterate over registered devices."""
+        return iter(self.devices.values())
+
+    def add(self, device_id, address, sensors=()):
+        """Register a new device."""
+        self.devices[device_id] = Device(device_id, address, sensors)
+        return self.devices[device_id]
+
+    def get(self, device_id=None):
+        """Return device with given id, or the first registered device if id
+        is None. Returns None if there is no such device.
+        """
+        if device_id is None:
+            return next(iter(self.devices.values()), None)
+        return self.devices.get(device_id)
+
+    def use_process_collectors(self):
+        """Check if collectors should run in separate processes, which is the
+        case when configured or when data is collected from multiple devices.
+        """
+        return configuration.app.get_collector_process() or len(self) > 1
+
+    @classmethod
+    def from_configuration(cls, muse_config):
+        """Create registry with devices from Muse configuration."""
+        registry = cls()
+        for device_id, address in muse_config.get_devices().items():
+            registry.add(device_id, address, muse_config.get_sensors())
+        return registry
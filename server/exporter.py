@@ -6,9 +6,215 @@ from datetime import datetime
 import json
 import base64
 import pickle
+import struct
+import zlib
+import lzma
+import queue
+import threading
+import time
 import numpy as np
 
 
+# File extensions of supported DataFrame formats.
+FORMATS = {"json": ".json", "binary": ".bin"}
+
+# Binary files start with MAGIC, header length (uint32) and JSON header.
+# Data blocks that follow are aligned to ALIGNMENT bytes.
+MAGIC = b"EEGDF\x00\x00\x01"
+ALIGNMENT = 64
+
+# Size of blocks in which JSON files are read until metadata is parsed.
+READ_SIZE = 64 * 1024
+
+# Keys of metadata stored in JSON files, see DataFrame._metadata().
+JSON_METADATA_KEYS = ("userid", "playback", "label", "timestamps")
+
+
+# Codecs of data blocks, "<quantization>-<compressor>", see encode_block().
+CODECS = ("none", "delta-zlib", "delta-lzma", "int16-zlib", "int16-lzma")
+_COMPRESSORS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def encode_block(array, codec):
+    """Compress array with codec, returns encoded bytes and parameters needed
+    to decode them. Samples are delta encoded per channel before compression:
+    delta: lossless, differences of the binary representation of values.
+    int16: lossy, values quantized to int16 with per channel scale and offset.
+    """
+    quantization, compressor = codec.split("-")
+    params = {}
+    if quantization == "int16":
+        array = np.asarray(array, np.float64)
+        low = array.min(axis=0) if len(array) else np.zeros(array.shape[1:])
+        high = array.max(axis=0) if len(array) else np.zeros(array.shape[1:])
+        offset = (high + low) / 2
+        scale = (high - low) / (2 * np.iinfo(np.int16).max)
+        scale[scale == 0] = 1.0
+        array = np.round((array - offset) / scale).astype("<i2")
+        params = {"scale": scale.tolist(), "offset": offset.tolist()}
+    else:
+        array = np.ascontiguousarray(array)
+        array = array.view(f"<i{array.dtype.itemsize}")
+
+    delta = array.copy()
+    delta[1:] -= array[:-1]
+    return _COMPRESSORS[compressor][0](delta.tobytes()), params
+
+
+def decode_block(content, dtype, shape, codec, params):
+    """Decompress array encoded with encode_block()."""
+    quantization, compressor = codec.split("-")
+    dtype = np.dtype(dtype)
+    int_dtype = "<i2" if quantization == "int16" else f"<i{dtype.itemsize}"
+    delta = np.frombuffer(_COMPRESSORS[compressor][1](content), int_dtype)
+    array = np.cumsum(delta.reshape(shape), axis=0, dtype=int_dtype)
+    if quantization == "int16":
+        return (array * np.array(params["scale"]) + params["offset"]).astype(dtype)
+    return array.view(dtype)
+
+
+def _align(offset):
+    """Round offset up to the nearest multiple of ALIGNMENT."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _datetime_jsonify(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj)} is not JSON serializable.")
+
+
+def _parse_timestamps(timestamps):
+    """Convert timestamps stored as ISO strings to datetime objects."""
+    for key in timestamps:
+        if timestamps[key] is not None:
+            timestamps[key] = datetime.fromisoformat(timestamps[key])
+    return timestamps
+
+
+def get_format(filename):
+    """Determine DataFrame file format from its extension, files with other
+    extensions are stored in json format.
+    """
+    extension = os.path.splitext(filename)[1]
+    for fmt, fmt_extension in FORMATS.items():
+        if extension == fmt_extension:
+            return fmt
+    return "json"
+
+
+def is_binary(filename):
+    """Check if file is stored in binary format."""
+    with open(filename, "rb") as input_file:
+        return input_file.read(len(MAGIC)) == MAGIC
+
+
+def read_header(filename):
+    """Read header of a binary DataFrame file.
+    Returns header dictionary and offset at which data blocks start.
+    """
+    with open(filename, "rb") as input_file:
+        if input_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a binary DataFrame file.")
+        (size,) = struct.unpack("<I", input_file.read(4))
+        header = json.loads(input_file.read(size).decode("utf-8"))
+    return header, _align(len(MAGIC) + 4 + size)
+
+
+_json_decoder = json.JSONDecoder()
+
+
+def _skip_whitespace(text, position):
+    while position < len(text) and text[position] in " \t\n\r":
+        position += 1
+    return position
+
+
+def _expect(text, position, characters, filename):
+    """Return character at position, which must be one of characters."""
+    if text[position] not in characters:
+        raise ValueError(f"{filename} is not a valid DataFrame file.")
+    return text[position]
+
+
+def read_json_metadata(filename, stop_key="eeg"):
+    """Parse top-level entries of JSON DataFrame file preceding stop_key,
+    without reading the rest of the file.
+    """
+    metadata = {}
+    with open(filename, "r", encoding="utf-8") as input_file:
+        text = input_file.read(READ_SIZE)
+        position = _skip_whitespace(text, 0)
+        _expect(text, position, "{", filename)
+        position += 1
+        while True:
+            try:
+                entry = _skip_whitespace(text, position)
+                if text[entry] == "}":
+                    return metadata
+                key, entry = _json_decoder.raw_decode(text, entry)
+                if key == stop_key:
+                    return metadata
+                entry = _skip_whitespace(text, entry)
+                _expect(text, entry, ":", filename)
+                entry = _skip_whitespace(text, entry + 1)
+                value, entry = _json_decoder.raw_decode(text, entry)
+                entry = _skip_whitespace(text, entry)
+                if _expect(text, entry, ",}", filename) == ",":
+                    entry += 1
+            except (IndexError, json.JSONDecodeError):
+                # Entry is not complete, parse it again with more text.
+                more = input_file.read(READ_SIZE)
+                if not more:
+                    raise ValueError(f"{filename} is not a valid DataFrame file.")
+                text += more
+                continue
+
+            metadata[key] = value
+            position = entry
+
+
+def _decode_stored_block(content, block):
+    """Decode compressed data block described by binary file header."""
+    return decode_block(
+        content, block["dtype"], block["shape"], block["codec"], block["params"]
+    )
+
+
+def _group_sensors(names, get_block):
+    """Group sensor data blocks into dictionary of (data, timestamps) pairs."""
+    sensors = {}
+    for name in names:
+        if name.startswith("sensors/") and not name.endswith("/timestamps"):
+            stream_type = name.split("/")[1]
+            sensors[stream_type] = (get_block(name), get_block(f"{name}/timestamps"))
+    return sensors or None
+
+
+class _LazyAttribute:
+    """DataFrame attribute which value can be provided by a loader function,
+    called on first access.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        loader = obj._loaders.pop(self.name, None)
+        if loader is not None:
+            obj.__dict__[self.name] = loader()
+        return obj.__dict__[self.name]
+
+    def __set__(self, obj, value):
+        obj._loaders.pop(self.name, None)
+        obj.__dict__[self.name] = value
+
+
 class DataFrame:
     """Stores single package of data.
     playback_info: dictionary with the data about playback item during which the signal was collected
@@ -16,49 +222,210 @@ class DataFrame:
     timestamps: relevant timestamps for: playback start and end, labeling time
     label: label that was assigned by the user during session
     userid: identification of the subject for whom the data was collected
+    sensors: optional dictionary with (data, timestamps) collected from other
+        Muse streams (PPG, ACC, GYRO) during the same period
+    gaps: optional list of gaps in eeg data, see buffers.find_gaps()
+    deviceid: optional identification of the Muse device used for recording
+    eeg_timestamps: optional timestamps of eeg samples
+
+    DataFrame can be saved in one of the FORMATS:
+    json: metadata and pickled, base64 encoded data in a JSON file, metadata
+        and shape of eeg data precede the data.
+    binary: JSON header with metadata and layout of data blocks, followed by
+        raw little-endian float32 samples and float64 timestamps.
+
+    Data can be compressed with one of the CODECS, in json format only eeg
+    data is compressed. Lossy int16 codecs are applied only to samples,
+    timestamps are compressed without loss.
+
+    DataFrame loaded lazily reads data only when eeg_data, eeg_timestamps or
+    sensors are accessed. Uncompressed data of binary files is then memory
+    mapped.
     """
 
-    def __init__(self, playback_info, eeg_data, timestamps, label, userid):
+    eeg_data = _LazyAttribute()
+    eeg_timestamps = _LazyAttribute()
+    sensors = _LazyAttribute()
+
+    def __init__(
+        self,
+        playback_info,
+        eeg_data,
+        timestamps,
+        label,
+        userid,
+        sensors=None,
+        gaps=None,
+        deviceid=None,
+        eeg_timestamps=None,
+    ):
         """Initialize DataFrame with data."""
+        self._loaders = {}
         self.playback_info = playback_info
         self.eeg_data = eeg_data
         self.timestamps = timestamps
         self.label = label
         self.userid = userid
+        self.sensors = sensors
+        self.gaps = gaps
+        self.deviceid = deviceid
+        self.eeg_timestamps = eeg_timestamps
         self._encoding = "utf-8"
+        self._eeg_shape = None
+
+    def get_eeg_shape(self):
+        """Return shape of eeg data, without loading it when the shape is
+        stored in the file it's loaded from.
+        """
+        if self._eeg_shape is not None and "eeg_data" in self._loaders:
+            return tuple(self._eeg_shape)
+        return np.shape(self.eeg_data)
 
     def serialize_eeg(self):
         """Serialize eeg data for compatibility with JSON format."""
-        eeg = pickle.dumps(self.eeg_data)
-        eeg = base64.b64encode(eeg)
-        return eeg.decode(self._encoding)
+        return self._serialize(self.eeg_data)
 
     @staticmethod
     def deserialize_eeg(eeg):
         return pickle.loads(base64.b64decode(eeg))
 
-    def save(self, filename):
-        """Export data frame to a json file."""
+    def _serialize(self, obj):
+        """Serialize object to base64 encoded pickle."""
+        data = base64.b64encode(pickle.dumps(obj))
+        return data.decode(self._encoding)
+
+    def save(self, filename, fmt=None, codec="none", catalog=None):
+        """Export data frame to a file, by default format is determined
+        from the file extension.
+        catalog: optional catalog.Catalog updated with the saved file.
+        """
         directory = os.path.dirname(filename)
         directory = os.path.abspath(directory)
         if not os.path.exists(directory):
             os.makedirs(directory)
 
-        data = {
+        if fmt is None:
+            fmt = get_format(filename)
+
+        if fmt == "binary":
+            self._save_binary(filename, codec)
+        else:
+            self._save_json(filename, codec)
+
+        if catalog is not None:
+            catalog.add(filename, self)
+
+    def _metadata(self):
+        """Return metadata stored in every format."""
+        metadata = {
             "userid": self.userid,
             "playback": self.playback_info,
             "label": self.label,
             "timestamps": self.timestamps,
-            "eeg": self.serialize_eeg(),
         }
+        if self.gaps is not None:
+            metadata["gaps"] = self.gaps
+        if self.deviceid is not None:
+            metadata["deviceid"] = self.deviceid
+        return metadata
 
-        def datetime_jsonify(obj):
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            raise TypeError(f"{type(obj)} is not JSON serializable.")
+    def _save_json(self, filename, codec="none"):
+        """Export data frame to a json file."""
+        data = self._metadata()
+        data["eeg_shape"] = list(np.shape(self.eeg_data))
+        if codec == "none":
+            data["eeg"] = self.serialize_eeg()
+        else:
+            eeg_data = np.asarray(self.eeg_data, "<f4")
+            content, params = encode_block(eeg_data, codec)
+            data["eeg_encoding"] = {
+                "codec": codec,
+                "dtype": eeg_data.dtype.str,
+                "shape": list(eeg_data.shape),
+                "params": params,
+            }
+            data["eeg"] = base64.b64encode(content).decode(self._encoding)
+        if self.eeg_timestamps is not None:
+            data["eeg_timestamps"] = self._serialize(self.eeg_timestamps)
+        if self.sensors is not None:
+            data["sensors"] = self._serialize(self.sensors)
 
         with open(filename, "w", encoding="utf-8") as output_file:
-            json.dump(data, output_file, default=datetime_jsonify)
+            json.dump(data, output_file, default=_datetime_jsonify)
+
+    def _get_blocks(self):
+        """Return (name, array) pairs stored as data blocks in binary format."""
+        blocks = [("eeg", np.asarray(self.eeg_data, dtype="<f4"))]
+        if self.eeg_timestamps is not None:
+            blocks.append(("eeg_timestamps", np.asarray(self.eeg_timestamps, "<f8")))
+        for stream_type, (data, timestamps) in (self.sensors or {}).items():
+            blocks.append((f"sensors/{stream_type}", np.asarray(data, "<f4")))
+            timestamps = np.asarray(timestamps, "<f8")
+            blocks.append((f"sensors/{stream_type}/timestamps", timestamps))
+        return blocks
+
+    def _save_binary(self, filename, codec="none"):
+        """Export data frame to a binary file."""
+        header = self._metadata()
+        header["codec"] = codec
+        header["blocks"] = []
+        contents = []
+        offset = 0
+        for name, array in self._get_blocks():
+            block = {
+                "name": name,
+                "dtype": array.dtype.str,
+                "shape": list(array.shape),
+                "offset": offset,
+            }
+            if codec == "none":
+                content = np.ascontiguousarray(array).tobytes()
+            else:
+                block["codec"] = codec
+                if array.dtype.kind == "f" and array.dtype.itemsize == 8:
+                    block["codec"] = codec.replace("int16", "delta")
+                content, block["params"] = encode_block(array, block["codec"])
+                block["size"] = len(content)
+            header["blocks"].append(block)
+            contents.append(content)
+            offset = _align(offset + len(content))
+
+        header_blocks = header["blocks"]
+        header = json.dumps(header, default=_datetime_jsonify).encode("utf-8")
+        data_start = _align(len(MAGIC) + 4 + len(header))
+        with open(filename, "wb") as output_file:
+            output_file.write(MAGIC)
+            output_file.write(struct.pack("<I", len(header)))
+            output_file.write(header)
+            for block, content in zip(header_blocks, contents):
+                output_file.seek(data_start + block["offset"])
+                output_file.write(content)
+            output_file.truncate(data_start + offset)
+
+    def snapshot(self):
+        """Return DataFrame with copies of data, safe to save in the background
+        while buffers that data was read from are overwritten.
+        """
+        sensors = None
+        if self.sensors is not None:
+            sensors = {
+                stream_type: (np.array(data), np.array(timestamps))
+                for stream_type, (data, timestamps) in self.sensors.items()
+            }
+        eeg_timestamps = None
+        if self.eeg_timestamps is not None:
+            eeg_timestamps = np.array(self.eeg_timestamps)
+        return DataFrame(
+            self.playback_info,
+            np.array(self.eeg_data),
+            dict(self.timestamps),
+            self.label,
+            self.userid,
+            sensors,
+            self.gaps,
+            self.deviceid,
+            eeg_timestamps,
+        )
 
     def __str__(self):
         """Convert DataFrame to human-readable string."""
@@ -78,17 +445,223 @@ class DataFrame:
         )
 
     @classmethod
-    def load(cls, filename):
-        """Import DataFrame from json file."""
-        with open(filename, "r", encoding="utf-8") as input_file:
-            data = json.load(input_file)
+    def load(cls, filename, lazy=False):
+        """Import DataFrame from a file in any of the supported formats.
+        lazy: read only metadata now, and data when it's accessed.
+        """
+        if is_binary(filename):
+            if lazy:
+                return cls._load_binary_lazy(filename)
+            return cls._load_binary(filename)
+
+        data_frame = cls._load_json(filename)
+        if not lazy:
+            for name in list(data_frame._loaders):
+                getattr(data_frame, name)
+        return data_frame
+
+    @classmethod
+    def _load_json(cls, filename):
+        """Import metadata from json file, which precedes the data. The whole
+        file is read and data is decoded on first access.
+        """
+        data = {}
+        loaded = False
+
+        def read():
+            nonlocal loaded
+            if not loaded:
+                with open(filename, "r", encoding="utf-8") as input_file:
+                    data.update(json.load(input_file))
+                loaded = True
+            return data
+
+        def decoder(key):
+            def decode():
+                if key not in read():
+                    return None
+                if key == "eeg" and "eeg_encoding" in data:
+                    encoding = data["eeg_encoding"]
+                    return decode_block(
+                        base64.b64decode(data.pop(key)),
+                        encoding["dtype"],
+                        encoding["shape"],
+                        encoding["codec"],
+                        encoding["params"],
+                    )
+                return cls.deserialize_eeg(data.pop(key))
 
-        eeg = cls.deserialize_eeg(data["eeg"])
-        timestamps = data["timestamps"]
-        for key in timestamps:
-            if timestamps[key] is not None:
-                timestamps[key] = datetime.fromisoformat(timestamps[key])
+            return decode
 
+        metadata = read_json_metadata(filename)
+        if not all(key in metadata for key in JSON_METADATA_KEYS):
+            # Metadata follows data in files not written by this module.
+            metadata = read()
+        data_frame = cls._from_metadata(metadata, None, None, None)
+        data_frame._eeg_shape = metadata.get("eeg_shape")
+        data_frame._loaders = {
+            "eeg_data": decoder("eeg"),
+            "eeg_timestamps": decoder("eeg_timestamps"),
+            "sensors": decoder("sensors"),
+        }
+        return data_frame
+
+    @classmethod
+    def _load_binary(cls, filename):
+        """Import DataFrame from binary file, reading it at once."""
+        header, data_start = read_header(filename)
+        with open(filename, "rb") as input_file:
+            content = bytearray(input_file.read())
+
+        blocks = {}
+        for block in header["blocks"]:
+            shape = tuple(block["shape"])
+            offset = data_start + block["offset"]
+            if "codec" in block:
+                blocks[block["name"]] = _decode_stored_block(
+                    content[offset : offset + block["size"]], block
+                )
+                continue
+            blocks[block["name"]] = np.frombuffer(
+                content,
+                dtype=block["dtype"],
+                count=int(np.prod(shape)),
+                offset=offset,
+            ).reshape(shape)
+
+        sensors = _group_sensors(blocks, blocks.get)
+        return cls._from_metadata(
+            header, blocks["eeg"], sensors, blocks.get("eeg_timestamps")
+        )
+
+    @classmethod
+    def _load_binary_lazy(cls, filename):
+        """Import metadata from binary file, data blocks are memory mapped,
+        or read and decompressed, on first access.
+        """
+        header, data_start = read_header(filename)
+        blocks = {block["name"]: block for block in header["blocks"]}
+
+        def mapper(name):
+            if name not in blocks:
+                return None
+            shape = tuple(blocks[name]["shape"])
+            dtype = np.dtype(blocks[name]["dtype"])
+            if 0 in shape:
+                return np.zeros(shape, dtype)
+            offset = data_start + blocks[name]["offset"]
+            if "codec" in blocks[name]:
+                with open(filename, "rb") as input_file:
+                    input_file.seek(offset)
+                    content = input_file.read(blocks[name]["size"])
+                return _decode_stored_block(content, blocks[name])
+            return np.memmap(filename, dtype, mode="r", offset=offset, shape=shape)
+
+        data_frame = cls._from_metadata(header, None, None, None)
+        data_frame._eeg_shape = blocks["eeg"]["shape"]
+        data_frame._loaders = {
+            "eeg_data": lambda: mapper("eeg"),
+            "eeg_timestamps": lambda: mapper("eeg_timestamps"),
+            "sensors": lambda: _group_sensors(blocks, mapper),
+        }
+        return data_frame
+
+    @classmethod
+    def _from_metadata(cls, metadata, eeg, sensors, eeg_timestamps):
+        """Create DataFrame from loaded metadata and data."""
         return cls(
-            data["playback"], eeg, data["timestamps"], data["label"], data["userid"]
+            metadata["playback"],
+            eeg,
+            _parse_timestamps(metadata["timestamps"]),
+            metadata["label"],
+            metadata["userid"],
+            sensors,
+            metadata.get("gaps"),
+            metadata.get("deviceid"),
+            eeg_timestamps,
         )
+
+
+class ExportWriter(threading.Thread):
+    """Thread saving queued DataFrames, so that exporting does not block
+    the caller. Queue is bounded, submit() blocks while it is full.
+    on_error: optional callback(filename, exception) called on failed save.
+    catalog: optional catalog.Catalog updated with saved files.
+    """
+
+    def __init__(self, max_pending=8, on_error=None, catalog=None):
+        """Initialize writer with queue holding up to max_pending DataFrames."""
+        super().__init__(name="ExportWriter", daemon=True)
+        self.queue = queue.Queue(max_pending)
+        self.on_error = on_error
+        self.catalog = catalog
+        self.lock = threading.Lock()
+        self.metrics = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "max_pending": 0,
+            "blocked": 0,
+            "blocked_time": 0.0,
+            "write_time": 0.0,
+        }
+
+    def submit(self, data_frame, filename, fmt=None, codec="none"):
+        """Queue snapshot of DataFrame to be saved to a file."""
+        item = (data_frame.snapshot(), filename, fmt, codec)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            start = time.monotonic()
+            self.queue.put(item)
+            with self.lock:
+                self.metrics["blocked"] += 1
+                self.metrics["blocked_time"] += time.monotonic() - start
+
+        with self.lock:
+            self.metrics["submitted"] += 1
+            pending = self.queue.qsize()
+            self.metrics["max_pending"] = max(self.metrics["max_pending"], pending)
+
+    def run(self):
+        """Save queued DataFrames until stopped."""
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self.queue.task_done()
+
+    def _write(self, data_frame, filename, fmt, codec):
+        """Save single DataFrame, recording the outcome in metrics."""
+        start = time.monotonic()
+        try:
+            data_frame.save(filename, fmt, codec, self.catalog)
+        except Exception as error:
+            with self.lock:
+                self.metrics["failed"] += 1
+            if self.on_error is not None:
+                self.on_error(filename, error)
+            return
+
+        with self.lock:
+            self.metrics["written"] += 1
+            self.metrics["write_time"] += time.monotonic() - start
+
+    def flush(self):
+        """Wait until all queued DataFrames are saved."""
+        self.queue.join()
+
+    def stop(self):
+        """Save all queued DataFrames and stop the thread."""
+        self.queue.put(None)
+        self.join()
+
+    def get_metrics(self):
+        """Return copy of metrics with current number of pending DataFrames."""
+        with self.lock:
+            metrics = dict(self.metrics)
+        metrics["pending"] = self.queue.qsize()
+        return metrics
@@ -0,0 +1,177 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Real-time extraction of band power features from eeg data.
+"""
+
+import threading
+
+import numpy
+
+from server import utils
+from server import buffers
+from server import filters
+
+
+class BandPowerEngine:
+    """Computes power of every band and channel over a sliding window, and
+    emits it every hop seconds to subscribed callbacks.
+
+    Power is the mean of squared band pass filtered signal. It's updated
+    incrementally, squares of samples entering the window are added to running
+    sums and squares of samples leaving the window, kept in a ring buffer,
+    are subtracted.
+
+    Optionally, windows with artifacts (e.g. blinks, movement) are flagged,
+    an artifact is a sample deviating from the running mean of its channel by
+    more than artifact_threshold standard deviations. Running statistics
+    are computed over the baseline period preceding the chunk.
+    """
+
+    def __init__(
+        self,
+        sampling,
+        channels,
+        bands=None,
+        window=1.0,
+        hop=0.25,
+        artifact_threshold=None,
+        baseline=10.0,
+    ):
+        """sampling: sampling rate of the signal, in Hz.
+        bands: dictionary of named (low, high) bands, by default filters.BANDS.
+        window, hop: length of the window and interval between features,
+            in seconds.
+        artifact_threshold: if given, windows with artifacts are flagged.
+        baseline: period of running statistics of the signal, in seconds.
+        """
+        self.bank = filters.FilterBank(sampling, channels, bands)
+        self.window = int(round(window * sampling))
+        self.hop = int(round(hop * sampling))
+        if not 0 < self.hop <= self.window:
+            raise ValueError("Hop must be positive and not longer than window.")
+
+        self.shape = (len(self.bank.bands), channels)
+        self.squares = buffers.RingBuffer(
+            self.window, self.shape[0] * self.shape[1], numpy.float64
+        )
+        self.total = numpy.zeros(self.shape[0] * self.shape[1])
+        self.subscribers = []
+        self.latest = None
+
+        self.artifact_threshold = artifact_threshold
+        self.baseline = None
+        if artifact_threshold is not None:
+            samples = max(self.window, int(round(baseline * sampling)))
+            self.baseline = utils.WindowedChunkStats(channels, samples)
+        # Absolute index of the last artifact sample of every channel.
+        self.last_artifact = numpy.full(channels, -1)
+
+    def get_band_names(self):
+        """Returns names of bands, in the order of power rows."""
+        return self.bank.get_band_names()
+
+    def subscribe(self, callback):
+        """Call callback(feature) with every emitted feature, which is a
+        dictionary with timestamp of the last sample in the window, power
+        array of shape (bands, channels) and artifact array of shape
+        (channels,), True for channels with an artifact in the window.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop calling callback."""
+        self.subscribers.remove(callback)
+
+    def process(self, data, timestamps):
+        """Process chunk of shape (samples, channels), returns list of
+        features emitted while processing it.
+        """
+        if len(timestamps) == 0:
+            return []
+        if self.baseline is not None:
+            self._detect_artifacts(data)
+        squares = self.bank.apply(data) ** 2
+        squares = squares.reshape(len(squares), -1)
+
+        features = []
+        position = 0
+        while position < len(squares):
+            end = position + self.hop - self.squares.written % self.hop
+            end = min(end, len(squares))
+            self._push(squares[position:end], timestamps[position:end])
+            position = end
+            written = self.squares.written
+            if written % self.hop == 0 and written >= self.window:
+                features.append(self._emit())
+        return features
+
+    def _push(self, squares, timestamps):
+        """Add squares of at most window samples to the running sums."""
+        written = self.squares.written
+        start = written - self.window
+        dropped, _ = self.squares.view(start, start + len(squares))
+        self.total -= dropped.sum(axis=0)
+        self.total += squares.sum(axis=0)
+        self.squares.write(squares, timestamps)
+
+        # Sums are recomputed once per window, so rounding errors of
+        # subtraction don't accumulate.
+        if written // self.window != self.squares.written // self.window:
+            self.total = self.squares.get_data().sum(axis=0)
+
+    def _detect_artifacts(self, data):
+        """Record artifacts of a chunk, compared with statistics of the signal
+        preceding it. Nothing is detected until the first window is complete.
+        """
+        data = numpy.asarray(data, dtype=numpy.float64)
+        if self.baseline.n >= self.window:
+            deviation = numpy.abs(data - self.baseline.mean())
+            limit = self.artifact_threshold * self.baseline.standard_deviation()
+            flagged = deviation > limit
+            last = len(data) - 1 - numpy.argmax(flagged[::-1], axis=0)
+            found = flagged.any(axis=0)
+            self.last_artifact[found] = self.squares.written + last[found]
+        self.baseline.push(data)
+
+    def _emit(self):
+        """Notify subscribers about the current feature."""
+        feature = {
+            "timestamp": float(self.squares.get_timestamps()[-1]),
+            "power": (self.total / self.window).reshape(self.shape),
+            "artifact": self.last_artifact >= self.squares.written - self.window,
+        }
+        self.latest = feature
+        for callback in self.subscribers:
+            callback(feature)
+        return feature
+
+
+class FeatureStage(threading.Thread):
+    """Thread feeding engine with eeg samples as they are collected.
+    Collector needs to provide buffer and lock, see muse.BufferReader.
+    """
+
+    def __init__(self, collector, engine, interval=0.05):
+        """Initialize stage, samples collected from now on are processed."""
+        super().__init__(name="FeatureStage", daemon=True)
+        self.collector = collector
+        self.engine = engine
+        self.interval = interval
+        self.position = collector.get_index()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Process new samples until stopped."""
+        while not self._stop_event.wait(self.interval):
+            with self.collector.lock:
+                buffer = self.collector.buffer
+                start = max(self.position, buffer.first_index())
+                end = buffer.written
+                data, timestamps = buffer.read(start, end)
+            self.position = end
+            self.engine.process(data, timestamps)
+
+    def stop(self):
+        """Stop the thread."""
+        self._stop_event.set()
+        self.join()
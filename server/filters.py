@@ -1,9 +1,99 @@
 """ 2021 Created by michal@buyuk-dev.com
 """
+import os
+import json
+import threading
+
 import numpy
 from scipy import signal
 
 
+# Frequency bands of eeg rhythms, in Hz.
+BANDS = {
+    "delta": (1, 4),
+    "theta": (4, 8),
+    "alpha": (8, 12),
+    "beta": (12, 30),
+    "gamma": (30, 44),
+}
+
+# Designed coefficients and frequency responses, shared by all filters.
+_designs = {}
+_responses = {}
+_lock = threading.Lock()
+_cache_file = None
+
+
+def _key(band, sampling, order, btype):
+    band = tuple(float(edge) for edge in numpy.atleast_1d(band))
+    return band, float(sampling), int(order), btype
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def set_cache_file(path):
+    """Persist designs in JSON file at path, designs already saved there are
+    loaded, new ones are added as they are designed.
+    """
+    global _cache_file
+    with _lock:
+        _cache_file = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            for entry in entries:
+                sos = numpy.array(entry["sos"], dtype=numpy.float64)
+                _designs.setdefault(_key(*entry["key"]), sos)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+
+def _save_designs():
+    entries = [{"key": key, "sos": sos.tolist()} for key, sos in _designs.items()]
+    with open(_cache_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    os.replace(_cache_file + ".tmp", _cache_file)
+
+
+def design(band, sampling, order=10, btype="bandpass"):
+    """Returns second order sections of butterworth filter, designed once for
+    each band, sampling rate, order and type. The array is shared by all
+    filters, so it must not be modified (sosfilt requires it writable).
+    """
+    key = _key(band, sampling, order, btype)
+    with _lock:
+        if key not in _designs:
+            Wn = key[0] if len(key[0]) > 1 else key[0][0]
+            _designs[key] = signal.butter(
+                N=order, Wn=Wn, btype=btype, output="sos", fs=sampling
+            )
+            if _cache_file is not None:
+                try:
+                    _save_designs()
+                except OSError:
+                    pass
+        return _designs[key]
+
+
+def frequency_response(band, sampling, order=10, btype="bandpass", worN=64):
+    """Returns normalized frequencies and response in dB of the filter,
+    computed once for each filter and number of frequencies.
+    """
+    key = _key(band, sampling, order, btype) + (worN,)
+    with _lock:
+        response = _responses.get(key)
+    if response is None:
+        w, h = signal.sosfreqz(design(band, sampling, order, btype), worN=worN)
+        db = 20 * numpy.log10(numpy.maximum(numpy.abs(h), 1e-5))
+        response = (_read_only(w / numpy.pi), _read_only(db))
+        with _lock:
+            response = _responses.setdefault(key, response)
+    return response
+
+
 class BandPassFilter:
     """Butterworth band pass filter.
 
@@ -15,9 +105,7 @@ class BandPassFilter:
         self.band = band
         self.sampling = sampling
         self.order = order
-        self.sos = signal.butter(
-            N=self.order, Wn=self.band, btype="bandpass", output="sos", fs=self.sampling
-        )
+        self.sos = design(self.band, self.sampling, self.order)
         self.z = numpy.zeros((self.sos.shape[0], 2))
 
     def apply(self, X):
@@ -26,7 +114,55 @@ class BandPassFilter:
         return Y
 
     def compute_frequency_response(self, max_freq=64):
-        """Plot frequency response using matplotlib."""
-        w, h = signal.sosfreqz(self.sos, worN=max_freq)
-        db = 20 * numpy.log10(np.maximum(np.abs(h), 1e-5))
-        return w / np.pi, db
+        """Returns normalized frequencies and response in dB, see
+        frequency_response().
+        """
+        return frequency_response(self.band, self.sampling, self.order, worN=max_freq)
+
+
+class MultiChannelFilter:
+    """Butterworth band pass filter applied to all channels at once,
+    to chunks of shape (samples, channels).
+    """
+
+    def __init__(self, band, sampling, channels, order=10):
+        """Initialize filter with zero state of every channel."""
+        self.band = band
+        self.sampling = sampling
+        self.channels = channels
+        self.order = order
+        self.sos = design(self.band, self.sampling, self.order)
+        # State of each section, for samples axis replaced by 2 delays.
+        self.z = numpy.zeros((self.sos.shape[0], 2, channels))
+
+    def apply(self, X):
+        """Returns filtered chunk."""
+        X = numpy.asarray(X)
+        if len(X) == 0:
+            return numpy.zeros((0, self.channels))
+        Y, self.z = signal.sosfilt(self.sos, X, axis=0, zi=self.z)
+        return Y
+
+
+class FilterBank:
+    """Set of MultiChannelFilters for multiple bands, streaming chunks of
+    shape (samples, channels) through all of them.
+    """
+
+    def __init__(self, sampling, channels, bands=None, order=10):
+        """bands: dictionary of named (low, high) bands, by default BANDS."""
+        self.bands = dict(BANDS if bands is None else bands)
+        self.filters = [
+            MultiChannelFilter(band, sampling, channels, order)
+            for band in self.bands.values()
+        ]
+
+    def get_band_names(self):
+        """Returns names of bands, in the order of apply() output."""
+        return list(self.bands)
+
+    def apply(self, X):
+        """Returns chunk filtered by every band, of shape
+        (samples, bands, channels).
+        """
+        return numpy.stack([bandpass.apply(X) for bandpass in self.filters], axis=1)
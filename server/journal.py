@@ -0,0 +1,230 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Append-only session journal, from which collected data can be recovered
+    after a crash.
+"""
+
+import os
+import json
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+import numpy
+
+
+# Every record starts with its kind, payload length and crc32 of the payload.
+RECORD_HEADER = struct.Struct("<4sII")
+CHUNK = b"CHNK"
+EVENT = b"EVNT"
+
+# Chunk payload starts with stream type, number of samples and channels,
+# followed by float32 samples and float64 timestamps.
+CHUNK_HEADER = struct.Struct("<8sII")
+
+
+def _encode_chunk(stream_type, data, timestamps):
+    """Encode chunk of samples as a record payload."""
+    data = numpy.ascontiguousarray(data, "<f4")
+    timestamps = numpy.ascontiguousarray(timestamps, "<f8")
+    header = CHUNK_HEADER.pack(stream_type.encode("utf-8"), *data.shape)
+    return header + data.tobytes() + timestamps.tobytes()
+
+
+def _decode_chunk(payload):
+    """Decode record payload to stream type, samples and timestamps."""
+    stream_type, count, channels = CHUNK_HEADER.unpack_from(payload)
+    offset = CHUNK_HEADER.size
+    data = numpy.frombuffer(payload, "<f4", count * channels, offset)
+    offset += data.nbytes
+    timestamps = numpy.frombuffer(payload, "<f8", count, offset)
+    stream_type = stream_type.rstrip(b"\x00").decode("utf-8")
+    return stream_type, data.reshape(count, channels), timestamps
+
+
+def _datetime_jsonify(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj)} is not JSON serializable.")
+
+
+class Journal:
+    """Append-only file with chunks of samples and session events.
+    Records are buffered in memory, and written with a single fsync by flush(),
+    so the cost of writing depends on the flush rate, not the number of records.
+    """
+
+    def __init__(self, path):
+        """Open journal file for appending."""
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.file = open(path, "ab")
+        self.pending = bytearray()
+        self.lock = threading.Lock()
+
+    def _append(self, kind, payload):
+        """Buffer a single record."""
+        with self.lock:
+            self.pending += RECORD_HEADER.pack(kind, len(payload), zlib.crc32(payload))
+            self.pending += payload
+
+    def append_chunk(self, stream_type, data, timestamps):
+        """Append chunk of samples of the given stream."""
+        self._append(CHUNK, _encode_chunk(stream_type, data, timestamps))
+
+    def append_event(self, event):
+        """Append session event, a dictionary with "type" key."""
+        payload = json.dumps(event, default=_datetime_jsonify)
+        self._append(EVENT, payload.encode("utf-8"))
+
+    def flush(self):
+        """Write buffered records to disk."""
+        with self.lock:
+            if not self.pending:
+                return
+            self.file.write(self.pending)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = bytearray()
+
+    def close(self):
+        """Flush buffered records and close the file."""
+        self.flush()
+        self.file.close()
+
+
+def read_journal(path):
+    """Yield (kind, payload) records from journal file. Reading stops at
+    the first incomplete or corrupted record, e.g. one torn by a crash.
+    """
+    with open(path, "rb") as input_file:
+        content = input_file.read()
+
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(content):
+        kind, size, checksum = RECORD_HEADER.unpack_from(content, offset)
+        offset += RECORD_HEADER.size
+        payload = content[offset : offset + size]
+        if len(payload) < size or zlib.crc32(payload) != checksum:
+            return
+        offset += size
+        yield kind, payload
+
+
+class JournalWriter(threading.Thread):
+    """Thread appending samples collected since its previous run to the journal
+    every interval seconds. Collector needs to provide buffers and lock,
+    see muse.BufferReader.
+    """
+
+    def __init__(self, journal, collector, interval=5.0):
+        """Initialize writer, samples collected from now on are journaled."""
+        super().__init__(name="JournalWriter", daemon=True)
+        self.journal = journal
+        self.collector = collector
+        self.interval = interval
+        self.positions = {
+            stream_type: buffer.written
+            for stream_type, buffer in collector.buffers.items()
+        }
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """Write new samples until stopped."""
+        while not self._stop_event.wait(self.interval):
+            self.write()
+        self.write()
+
+    def write(self):
+        """Append samples collected since the previous write and flush."""
+        for stream_type, buffer in self.collector.buffers.items():
+            with self.collector.lock:
+                start = max(self.positions[stream_type], buffer.first_index())
+                end = buffer.written
+                data, timestamps = buffer.read(start, end)
+            self.positions[stream_type] = end
+            if len(timestamps) > 0:
+                self.journal.append_chunk(stream_type, data, timestamps)
+        self.journal.flush()
+
+    def stop(self):
+        """Write remaining samples and stop the thread."""
+        self._stop_event.set()
+        self.join()
+
+
+def _parse_datetime(value):
+    return None if value is None else datetime.fromisoformat(value)
+
+
+def recover(path):
+    """Rebuild playback items recorded in the journal.
+    Returns list of dictionaries with playback, markers, label, userid,
+    deviceid, eeg (data, timestamps) and sensors, an item that was not
+    finished ends with the last recorded sample.
+    """
+    chunks = {}
+    session = {}
+    items = []
+    item = None
+    for kind, payload in read_journal(path):
+        if kind == CHUNK:
+            stream_type, data, timestamps = _decode_chunk(payload)
+            chunks.setdefault(stream_type, []).append((data, timestamps))
+            continue
+
+        event = json.loads(payload.decode("utf-8"))
+        timestamp = _parse_datetime(event.get("timestamp"))
+        if event["type"] == "session":
+            session = event
+        elif event["type"] == "start":
+            item = {
+                "playback": event["playback"],
+                "markers": {"start": timestamp, "end": None, "labeling": None},
+                "label": None,
+                "range": [event["stream_time"], None],
+            }
+        elif item is not None and event["type"] == "label":
+            item["label"] = event["label"]
+            item["markers"]["labeling"] = timestamp
+        elif item is not None and event["type"] == "end":
+            item["markers"]["end"] = timestamp
+            item["range"][1] = event["stream_time"]
+            items.append(item)
+            item = None
+
+    if item is not None:
+        items.append(item)
+
+    streams = {
+        stream_type: (
+            numpy.concatenate([data for data, _ in stream_chunks]),
+            numpy.concatenate([timestamps for _, timestamps in stream_chunks]),
+        )
+        for stream_type, stream_chunks in chunks.items()
+    }
+
+    def segment(stream_type, t_start, t_end):
+        if stream_type not in streams:
+            return numpy.zeros((0, 0), numpy.float32), numpy.zeros(0)
+        data, timestamps = streams[stream_type]
+        start = 0 if t_start is None else numpy.searchsorted(timestamps, t_start)
+        end = len(timestamps)
+        if t_end is not None:
+            end = numpy.searchsorted(timestamps, t_end)
+        return data[start:end], timestamps[start:end]
+
+    for item in items:
+        t_start, t_end = item.pop("range")
+        item["userid"] = session.get("userid")
+        item["deviceid"] = session.get("deviceid")
+        item["eeg"] = segment("EEG", t_start, t_end)
+        item["sensors"] = {
+            stream_type: segment(stream_type, t_start, t_end)
+            for stream_type in streams
+            if stream_type != "EEG"
+        }
+    return items
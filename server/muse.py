@@ -1,27 +1,70 @@
 """ 2021 Created by michal@buyuk-dev.com
 """
 
+import os
 import sys
+import time
 
 import threading
 import multiprocessing
 from pprint import pformat
+from datetime import datetime
 
+import numpy
 import muselsl
 import pylsl
 
-from server import configuration
+try:
+    from pylsl import LostError
+except ImportError:
+    # Since pylsl 1.17 exceptions are only available from pylsl.util.
+    from pylsl.util import LostError
+
 from server.logger import logger
 
 from server import utils
+from server import buffers
+
+
+# Types of additional LSL streams that Muse can provide next to EEG.
+SENSOR_STREAM_TYPES = ("PPG", "ACC", "GYRO")
+
+# Maximum time to wait for muselsl to connect to Muse and create outlets, in seconds.
+STREAM_START_TIMEOUT = 30
+
+# Timeout of a resolve by source, of a stream that is expected to exist, in seconds.
+RECONNECT_TIMEOUT = 1.0
+
+
+def get_source_id(address):
+    """Return LSL source_id that muselsl assigns to streams of given Muse."""
+    return f"Muse{address}"
+
+
+def _signal_when_streaming(address, ready):
+    """Set ready event once the EEG outlet for given Muse can be resolved."""
+    predicate = _stream_predicate("EEG", source_id=get_source_id(address))
+    if pylsl.resolve_bypred(predicate, timeout=STREAM_START_TIMEOUT):
+        ready.set()
 
 
 # DO NOT CHANGE THIS FUNCTION, READ DOCSTRING
-def Stream_stream_process(address):
+def Stream_stream_process(address, sensors=(), ready=None):
     """needs to be a global scope, importable object due to pickling
     done in multiprocessing.
+    ready: optional event that is set when the stream can be connected to.
     """
-    muselsl.stream(address=address, backend="bleak")
+    if ready is not None:
+        threading.Thread(
+            target=_signal_when_streaming, args=(address, ready), daemon=True
+        ).start()
+    muselsl.stream(
+        address=address,
+        backend="bleak",
+        ppg_enabled="PPG" in sensors,
+        acc_enabled="ACC" in sensors,
+        gyro_enabled="GYRO" in sensors,
+    )
 
 
 class InletAdapter(pylsl.StreamInlet):
@@ -48,6 +91,17 @@ class InletAdapter(pylsl.StreamInlet):
             xml = xml.next_sibling()
         return channels
 
+    def pull_chunk_into(self, data, timestamps, timeout=0.1):
+        """Pull chunk directly into preallocated (samples, channels) data array,
+        store its timestamps in timestamps array and return number of samples.
+        """
+        _, chunk_timestamps = self.pull_chunk(
+            timeout=timeout, max_samples=len(data), dest_obj=data
+        )
+        count = len(chunk_timestamps)
+        timestamps[:count] = chunk_timestamps
+        return count
+
     def __str__(self):
         """Return readable info about connected stream."""
         return pformat(
@@ -55,9 +109,29 @@ class InletAdapter(pylsl.StreamInlet):
         )
 
 
-def find_lsl_stream(max_chunklen=30, timeout=30, stream_type="EEG"):
-    """Resolve existing LSL stream with EEG data."""
-    streams = pylsl.resolve_byprop("type", stream_type, timeout=timeout)
+def _stream_predicate(stream_type, source_id=None, hostname=None):
+    """Build XPath predicate matching stream of given type and origin."""
+    predicate = f"type='{stream_type}'"
+    if source_id is not None:
+        predicate += f" and source_id='{source_id}'"
+    if hostname is not None:
+        predicate += f" and hostname='{hostname}'"
+    return predicate
+
+
+def find_lsl_stream(
+    max_chunklen=30, timeout=30, stream_type="EEG", source_id=None, hostname=None
+):
+    """Resolve existing LSL stream with data of given type.
+    If source_id or hostname is given only matching streams are resolved.
+    Inlet timestamps are synchronized to the local LSL clock, so that all
+    streams share the same clock.
+    """
+    if source_id is None and hostname is None:
+        streams = pylsl.resolve_byprop("type", stream_type, timeout=timeout)
+    else:
+        predicate = _stream_predicate(stream_type, source_id, hostname)
+        streams = pylsl.resolve_bypred(predicate, timeout=timeout)
     if len(streams) == 0:
         logger.warning("No active streams have been found.")
         return None
@@ -67,125 +141,414 @@ def find_lsl_stream(max_chunklen=30, timeout=30, stream_type="EEG"):
         logger.info(f"{idx}: {stream}")
 
     logger.info("Connecting to stream #0.")
-    inlet = InletAdapter(streams[0], max_chunklen=max_chunklen)
+    inlet = InletAdapter(
+        streams[0], max_chunklen=max_chunklen, processing_flags=pylsl.proc_clocksync
+    )
 
     logger.info(f"Connected stream info: {inlet}.")
     return inlet
 
 
 class Stream:
-    """Wrapper to the muselsl.Stream class that enables stream termination."""
+    """Wrapper to the muselsl.Stream class that enables stream termination.
+    Apart from EEG, selected sensor streams (see SENSOR_STREAM_TYPES) can be
+    enabled, each is received through its own inlet.
 
-    def __init__(self, muse_address):
+    Stream can be started, stopped and restarted from multiple threads (HTTP
+    handlers, stream watchdog), the lock guards its process and inlets.
+    """
+
+    def __init__(self, muse_address, sensors=()):
         """Initialize stream."""
         self.muse_address = muse_address
+        self.stream_types = ["EEG"] + [t for t in SENSOR_STREAM_TYPES if t in sensors]
+        # (source_id, hostname) of resolved streams, used for fast reconnects.
+        self.sources = {}
+        self.lock = threading.RLock()
         self._reset()
 
-    def start(self):
-        """Start stream."""
-        if self.is_running():
-            logger.warning("Stream process is already running.")
-        else:
-            self._start_stream_process()
-            self._connect()
+    @property
+    def inlet(self):
+        """Inlet of the EEG stream."""
+        return self.inlets.get("EEG")
+
+    def start(self, wait=True):
+        """Start stream.
+        wait: wait until inlets are connected, otherwise they are connected
+            in the background, see is_connecting().
+        """
+        with self.lock:
+            if self.is_running() or self.is_connecting():
+                logger.warning("Stream process is already running.")
+            else:
+                self._start_stream_process()
+                self.connector = threading.Thread(target=self._connect, daemon=True)
+                self.connector.start()
+            connector = self.connector
+        if wait and connector is not None:
+            connector.join()
         return self.is_running()
 
     def stop(self):
         """Stop stream."""
-        if not self.is_running():
-            logger.warning("Stream process was not running.")
-        else:
-            logger.info("Terminating LSL stream...")
-            self.process.terminate()
-            self.process.join()
-
-            if not self.process.is_alive():
-                logger.info("LSL streaming process was terminated.")
-                self._reset()
+        with self.lock:
+            if self.process is None:
+                logger.warning("Stream process was not running.")
             else:
-                logger.error("LSL streaming process is still alive.")
+                logger.info("Terminating LSL stream...")
+                self.process.terminate()
+                self.process.join()
+
+                if not self.process.is_alive():
+                    logger.info("LSL streaming process was terminated.")
+                    self._reset()
+                else:
+                    logger.error("LSL streaming process is still alive.")
 
         return self.is_running()
 
+    def reconnect(self):
+        """Reconnect inlets to the streams of running stream process."""
+        with self.lock:
+            self.inlets = {}
+        self._connect()
+        return self.is_running()
+
+    def restart(self, wait=True):
+        """Restart stream process and reconnect to its streams, wait as in
+        start(). Stream that was stopped is not restarted.
+        """
+        with self.lock:
+            if self.process is None:
+                logger.warning("Stream was stopped, it is not restarted.")
+                return False
+            logger.info("Restarting LSL stream...")
+            self.process.terminate()
+            self.process.join()
+            self._reset()
+        return self.start(wait)
+
     def is_running(self):
         """Check if stream is running."""
         if None in (self.process, self.inlet):
             return False
         return self.process.is_alive()
 
-    def pull_chunk(self, timeout=0.1):
-        """Pull data chunk from the stream."""
-        return self.inlet.pull_chunk(timeout=timeout)
+    def is_connecting(self):
+        """Check if inlets are being connected in the background."""
+        return self.connector is not None and self.connector.is_alive()
 
-    def get_channels_count(self):
+    def pull_chunk(self, timeout=0.1, stream_type="EEG"):
+        """Pull data chunk from the stream."""
+        return self.inlets[stream_type].pull_chunk(timeout=timeout)
+
+    def pull_chunk_into(self, data, timestamps, timeout=0.1, stream_type="EEG"):
+        """Pull data chunk into preallocated buffers, return number of samples.
+        Returns 0 if the stream is not connected or its source was lost.
+        """
+        inlet = self.inlets.get(stream_type)
+        if inlet is None:
+            return 0
+        try:
+            return inlet.pull_chunk_into(data, timestamps, timeout=timeout)
+        except LostError:
+            logger.warning(f"Source of {stream_type} stream has been lost.")
+            return 0
+
+    def get_channels_count(self, stream_type="EEG"):
         """Return number of channels in the connected stream."""
-        if self.inlet is not None:
-            return self.inlet.get_channels_count()
+        if stream_type in self.inlets:
+            return self.inlets[stream_type].get_channels_count()
 
-    def get_sampling_rate(self):
+    def get_sampling_rate(self, stream_type="EEG"):
         """Return sampling rate for connected stream."""
-        if self.inlet is not None:
-            return self.inlet.get_sampling_rate()
+        if stream_type in self.inlets:
+            return self.inlets[stream_type].get_sampling_rate()
 
-    def get_channels(self):
+    def get_channels(self, stream_type="EEG"):
         """Return channels info for connected stream."""
-        if self.inlet is not None:
-            return self.inlet.get_channels()
+        if stream_type in self.inlets:
+            return self.inlets[stream_type].get_channels()
+
+    def get_stream_types(self):
+        """Return types of connected streams."""
+        return list(self.inlets)
 
     def _start_stream_process(self):
         """Start new LSL stream process."""
-        logger.info("Starting stream for Muse @ {muse_address}.")
+        logger.info(f"Starting stream for Muse @ {self.muse_address}.")
+        self.ready = multiprocessing.Event()
         self.process = multiprocessing.Process(
-            target=Stream_stream_process, args=(self.muse_address,)
+            target=Stream_stream_process,
+            args=(self.muse_address, self.stream_types[1:], self.ready),
         )
         self.process.start()
 
     def _connect(self):
-        """Connect inlet to the stream if running."""
-        self.inlet = find_lsl_stream()
-        if self.inlet is None:
-            logger.warning("Failed to find a connector.")
+        """Connect inlets to the streams once the stream process is ready.
+        Inlets are dropped if the stream was stopped or restarted meanwhile.
+        """
+        ready = self.ready
+        if not ready.wait(STREAM_START_TIMEOUT):
+            logger.warning("Stream process has not reported readiness.")
+            return
+
+        inlets = {}
+        for stream_type in self.stream_types:
+            inlet = self._find_inlet(stream_type)
+            if inlet is None:
+                logger.warning(f"Failed to find a connector for {stream_type}.")
+            else:
+                inlets[stream_type] = inlet
+                info = inlet.info()
+                self.sources[stream_type] = (info.source_id(), info.hostname())
+        with self.lock:
+            if ready is self.ready:
+                self.inlets.update(inlets)
+
+    def _find_inlet(self, stream_type):
+        """Resolve stream using cached source info if available, then by
+        Muse source_id. Streams are never resolved by type only, as it could
+        match stream of another Muse.
+        """
+        if stream_type in self.sources:
+            source_id, hostname = self.sources[stream_type]
+            inlet = find_lsl_stream(
+                timeout=RECONNECT_TIMEOUT,
+                stream_type=stream_type,
+                source_id=source_id,
+                hostname=hostname,
+            )
+            if inlet is not None:
+                return inlet
+
+        return find_lsl_stream(
+            timeout=RECONNECT_TIMEOUT,
+            stream_type=stream_type,
+            source_id=get_source_id(self.muse_address),
+        )
 
     def _reset(self):
         """Reset stream properties."""
         self.process = None
-        self.inlet = None
+        self.ready = None
+        self.connector = None
+        self.inlets = {}
 
 
-class DataCollector(utils.StoppableThread):
-    """Stream data processor, executes main processing loop and collects data."""
+def _buffer_capacity(stream, stream_type, buffer_size):
+    """Return number of samples to keep for a stream, buffer_size is given
+    in EEG samples and is scaled by stream's sampling rate.
+    """
+    rate = stream.get_sampling_rate(stream_type)
+    if buffer_size is None:
+        return rate * DataCollector.DEFAULT_BUFFER_DURATION
+    return max(1, buffer_size * rate // stream.get_sampling_rate())
 
-    def __init__(self, stream, buffer_size=None, *args, **kwargs):
-        """Initialize data collector."""
-        super().__init__(*args, **kwargs)
-        self.stream = stream
-        self.buffer_size = buffer_size
-        self.lock = threading.Lock()
-        self.running = False
-        self.data = None
-        self.timestamps = None
-        self.clear()
+
+class BufferReader:
+    """Access to data collected in buffers, shared by collector implementations.
+    Requires buffers dictionary (keyed by stream type) and lock attributes,
+    methods without stream_type argument access the EEG buffer.
+    """
+
+    clock_offset = None
+
+    @property
+    def buffer(self):
+        """Buffer with EEG samples."""
+        return self.buffers["EEG"]
 
     def clear(self):
         """Clear collected data."""
-        self.data = [tuple([0] * self.stream.get_channels_count())]
-        self.timestamps = []
+        with self.lock:
+            for buffer in self.buffers.values():
+                buffer.clear()
 
     def get_data_size(self):
         """Returns the size of the data in buffer in number of samples."""
-        return (
-            len(self.data)
-            * self.stream.get_channels_count()
-            * self.stream.get_sampling_rate()
-        )
+        return len(self.buffer)
 
     def get_data(self):
         """Returns a copy of collected data."""
-        return self.data.copy()
+        with self.lock:
+            return self.buffer.read()[0]
 
     def get_timestamps(self):
         """Returns a copy of collected timestamps."""
-        return self.timestamps.copy()
+        with self.lock:
+            return self.buffer.read()[1]
+
+    def get_segment(self, t_start=None, t_end=None, stream_type="EEG"):
+        """Returns (data, timestamps) views of samples recorded in [t_start; t_end).
+        Bounds can be datetime objects (wall clock) or stream timestamps,
+        None means the segment is not bounded from that side.
+        """
+        with self.lock:
+            buffer = self.buffers[stream_type]
+            start = buffer.first_index()
+            end = buffer.written
+            if t_start is not None:
+                start = buffer.search(self.to_stream_time(t_start))
+            if t_end is not None:
+                end = buffer.search(self.to_stream_time(t_end))
+            return buffer.view(start, end)
+
+    def find_gaps(self, timestamps):
+        """Returns gaps in given EEG timestamps, see buffers.find_gaps()."""
+        return buffers.find_gaps(timestamps, self.stream.get_sampling_rate())
+
+    def get_sensors(self, t_start=None, t_end=None):
+        """Returns dictionary with (data, timestamps) segments of all streams
+        other than EEG, bounds are the same as in get_segment().
+        """
+        return {
+            stream_type: self.get_segment(t_start, t_end, stream_type)
+            for stream_type in self.buffers
+            if stream_type != "EEG"
+        }
+
+    def get_range(self, start, end):
+        """Returns (data, timestamps) views of samples in absolute index range,
+        None means the range is not bounded from that side.
+        """
+        with self.lock:
+            if start is None:
+                start = self.buffer.first_index()
+            if end is None:
+                end = self.buffer.written
+            return self.buffer.view(start, end)
+
+    def get_index(self, timestamp=None):
+        """Returns absolute index of the first sample recorded at or after timestamp,
+        or index of the next sample to be recorded if timestamp is None.
+        """
+        with self.lock:
+            if timestamp is None:
+                return self.buffer.written
+            return self.buffer.search(self.to_stream_time(timestamp))
+
+    def to_stream_time(self, timestamp):
+        """Convert wall clock datetime to stream timestamp."""
+        if not isinstance(timestamp, datetime):
+            return timestamp
+        if self.clock_offset is None and len(self.buffer) > 0:
+            self._calibrate_clock(self.buffer.get_timestamps()[-1])
+        return timestamp.timestamp() - (self.clock_offset or 0.0)
+
+    def _calibrate_clock(self, timestamp):
+        """Determine offset between wall clock and stream timestamps.
+        Muse streams can be timestamped with either wall clock or LSL clock,
+        the one closer to the latest sample timestamp is assumed.
+        """
+        wall_clock, lsl_clock = time.time(), pylsl.local_clock()
+        if abs(wall_clock - timestamp) < abs(lsl_clock - timestamp):
+            self.clock_offset = 0.0
+        else:
+            self.clock_offset = wall_clock - lsl_clock
+
+
+class StreamWatchdog(utils.StoppableThread):
+    """Detects a stalled stream, when no new samples arrive in the buffer,
+    and restarts it. Can be run as a thread or by calling check() periodically.
+    Stream is restarted in a separate thread, so that check() never blocks
+    the caller, e.g. the collector's polling loop.
+    """
+
+    # Time without new samples after which stream is restarted, in seconds.
+    STALL_TIMEOUT = 3.0
+
+    # Interval between checks when run as a thread, in seconds.
+    CHECK_INTERVAL = 0.5
+
+    def __init__(self, stream, buffer, *args, **kwargs):
+        """Initialize watchdog for stream writing to buffer."""
+        super().__init__(*args, **kwargs)
+        self.stream = stream
+        self.buffer = buffer
+        self.restarts = 0
+        self.restarter = None
+        self.last_written = buffer.written
+        self.last_progress = time.monotonic()
+
+    def is_restarting(self):
+        """Check if stream is being restarted."""
+        return self.restarter is not None and self.restarter.is_alive()
+
+    def check(self):
+        """Restart stream if stalled, return False if it is being restarted."""
+        now = time.monotonic()
+        if self.is_restarting():
+            self.last_progress = now
+            return False
+
+        written = self.buffer.written
+        if written != self.last_written:
+            self.last_written, self.last_progress = written, now
+            return True
+
+        if now - self.last_progress < self.STALL_TIMEOUT:
+            return True
+
+        logger.warning(
+            f"No samples received for {now - self.last_progress:.1f}s, "
+            "restarting stream."
+        )
+        self.restarts += 1
+        self.restarter = threading.Thread(
+            target=self.stream.restart, name="StreamRestart", daemon=True
+        )
+        self.restarter.start()
+        self.last_progress = now
+        return False
+
+    def run(self):
+        """Check stream in a loop until watchdog is stopped."""
+        while not self.stopped():
+            self.check()
+            time.sleep(self.CHECK_INTERVAL)
+
+
+class DataCollector(BufferReader, utils.StoppableThread):
+    """Stream data processor, executes main processing loop and collects data.
+    All streams are served by a single polling loop, each into its own buffer.
+    """
+
+    # Buffer length in seconds used when buffer_size is not specified.
+    DEFAULT_BUFFER_DURATION = 60 * 60
+
+    # Maximum number of samples pulled from the stream at once.
+    MAX_CHUNK_SIZE = 1024
+
+    # Time to wait when none of the streams had new samples, in seconds.
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, stream, buffer_size=None, storage_dir=None, *args, **kwargs):
+        """Initialize data collector.
+        buffer_size: number of most recent EEG samples kept in the buffer.
+        storage_dir: if given, all samples are recorded to memory mapped files
+            in this directory instead of an in-memory ring buffer.
+        """
+        super().__init__(*args, **kwargs)
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.buffers = {}
+        for stream_type in stream.get_stream_types():
+            channels = stream.get_channels_count(stream_type)
+            if storage_dir is not None:
+                directory = os.path.join(storage_dir, stream_type)
+                self.buffers[stream_type] = buffers.MappedBuffer(directory, channels)
+            else:
+                self.buffers[stream_type] = buffers.RingBuffer(
+                    _buffer_capacity(stream, stream_type, buffer_size),
+                    channels,
+                    reserve_size=self.MAX_CHUNK_SIZE,
+                )
+        self.chunk_timestamps = numpy.zeros(self.MAX_CHUNK_SIZE, dtype=numpy.float64)
+        self.watchdog = StreamWatchdog(stream, self.buffer)
 
     def is_running(self):
         """Check if collector is running."""
@@ -195,11 +558,162 @@ class DataCollector(utils.StoppableThread):
         """Collect data in a loop until collector is stopped."""
         self.running = True
         while not self.stopped():
-            chunk, timestamps = self.stream.pull_chunk()
-            with self.lock:
-                self.data.extend(chunk)
-                self.timestamps.extend(timestamps)
-                if self.buffer_size is not None:
-                    self.data = self.data[-self.buffer_size :]
-                    self.timestamps = self.timestamps[-self.buffer_size :]
+            if self._poll() == 0:
+                self.watchdog.check()
+                time.sleep(self.POLL_INTERVAL)
+        with self.lock:
+            for buffer in self.buffers.values():
+                buffer.flush()
         self.running = False
+
+    def _poll(self):
+        """Pull samples available in all streams, return number of samples."""
+        received = 0
+        for stream_type, buffer in self.buffers.items():
+            with self.lock:
+                destination = buffer.reserve(self.MAX_CHUNK_SIZE)
+            count = self.stream.pull_chunk_into(
+                destination, self.chunk_timestamps, 0.0, stream_type
+            )
+            with self.lock:
+                buffer.commit(self.chunk_timestamps[:count])
+            received += count
+        return received
+
+
+# DO NOT CHANGE THIS FUNCTION'S SCOPE, READ DOCSTRING
+def DataCollector_collect_process(buffer_specs, stop):
+    """Collection loop run in a separate process, publishes samples through
+    shared ring buffers. Needs to be a global scope, importable object due
+    to pickling done in multiprocessing.
+    buffer_specs: list of (stream_type, buffer_name, capacity, channels,
+        source_id, hostname), streams are resolved by their source, so that
+        data of another Muse is never collected.
+    Streams which source was lost are resolved again, while the stream
+    watchdog of the parent process restarts them.
+    """
+    inlets, sources, shared_buffers = {}, {}, {}
+    for spec in buffer_specs:
+        stream_type, buffer_name, capacity, channels, source_id, hostname = spec
+        sources[stream_type] = (source_id, hostname)
+        inlets[stream_type] = find_lsl_stream(
+            stream_type=stream_type, source_id=source_id, hostname=hostname
+        )
+        if inlets[stream_type] is None:
+            return
+        shared_buffers[stream_type] = buffers.SharedRingBuffer(
+            capacity,
+            channels,
+            name=buffer_name,
+            reserve_size=DataCollector.MAX_CHUNK_SIZE,
+        )
+
+    timestamps = numpy.zeros(DataCollector.MAX_CHUNK_SIZE, dtype=numpy.float64)
+    while not stop.is_set():
+        received = 0
+        for stream_type, buffer in shared_buffers.items():
+            destination = buffer.reserve(DataCollector.MAX_CHUNK_SIZE)
+            try:
+                count = inlets[stream_type].pull_chunk_into(
+                    destination, timestamps, 0.0
+                )
+            except LostError:
+                logger.warning(f"Source of {stream_type} stream has been lost.")
+                count = 0
+                source_id, hostname = sources[stream_type]
+                inlet = find_lsl_stream(
+                    timeout=RECONNECT_TIMEOUT,
+                    stream_type=stream_type,
+                    source_id=source_id,
+                    hostname=hostname,
+                )
+                if inlet is not None:
+                    inlets[stream_type] = inlet
+            buffer.commit(timestamps[:count])
+            received += count
+        if received == 0:
+            time.sleep(DataCollector.POLL_INTERVAL)
+
+    for buffer in shared_buffers.values():
+        buffer.close()
+
+
+class ProcessDataCollector(BufferReader):
+    """Data collector running in its own process, so that pulling data is not
+    delayed by other threads of the server. Samples are read from shared memory
+    without copying or locking between processes, the lock only guards access
+    from multiple threads of this process.
+    """
+
+    def __init__(self, stream, buffer_size=None):
+        """Initialize data collector, buffer_size as in DataCollector."""
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.process = None
+        self.stop_event = multiprocessing.Event()
+        self.buffers = {
+            stream_type: buffers.SharedRingBuffer(
+                _buffer_capacity(stream, stream_type, buffer_size),
+                stream.get_channels_count(stream_type),
+                reserve_size=DataCollector.MAX_CHUNK_SIZE,
+            )
+            for stream_type in stream.get_stream_types()
+        }
+        self.watchdog = ProcessWatchdog(self, daemon=True)
+
+    def start(self):
+        """Start collection process."""
+        self._start_process()
+        self.watchdog.start()
+
+    def _start_process(self):
+        """Start new process collecting data into the shared buffers."""
+        logger.info("Starting data collection process.")
+        default_source = (get_source_id(self.stream.muse_address), None)
+        buffer_specs = [
+            (stream_type, buffer.name, buffer.capacity, buffer.channels)
+            + self.stream.sources.get(stream_type, default_source)
+            for stream_type, buffer in self.buffers.items()
+        ]
+        self.process = multiprocessing.Process(
+            target=DataCollector_collect_process,
+            args=(buffer_specs, self.stop_event),
+        )
+        self.process.start()
+
+    def stop(self):
+        """Stop collection process and release shared memory."""
+        self.watchdog.stop()
+        if self.watchdog.is_alive():
+            self.watchdog.join()
+        self.stop_event.set()
+        if self.process is not None:
+            self.process.join()
+        for buffer in self.buffers.values():
+            buffer.close()
+            buffer.unlink()
+
+    def is_running(self):
+        """Check if collector is running."""
+        if self.process is None or self.stop_event.is_set():
+            return False
+        return self.process.is_alive()
+
+
+class ProcessWatchdog(StreamWatchdog):
+    """StreamWatchdog of ProcessDataCollector, which also restarts the
+    collection process if it has exited.
+    """
+
+    def __init__(self, collector, *args, **kwargs):
+        """Initialize watchdog of the collector and its stream."""
+        super().__init__(collector.stream, collector.buffer, *args, **kwargs)
+        self.collector = collector
+
+    def check(self):
+        """Restart collection process if it has exited, then check stream."""
+        if not self.collector.stop_event.is_set():
+            if not self.collector.process.is_alive():
+                logger.warning("Data collection process has exited, restarting it.")
+                self.collector._start_process()
+        return super().check()
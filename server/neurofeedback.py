@@ -6,9 +6,15 @@ import numpy as numpy
 from server import configuration
 from server.muse import Stream
 from server.plotter import SignalPlotter
-from server.filter import BandPassFilter
-from server import utils
-from utils import generate_complex_signal, plot, compute_spectrum
+from server.filters import MultiChannelFilter
+from server.features import BandPowerEngine
+from server.utils import SpectrumEstimator, ExponentialChunkStats
+
+# Weight of the newest feature in running statistics of log alpha power.
+NORMALIZATION_ALPHA = 1 / 240
+
+# Samples deviating by more standard deviations are artifacts.
+ARTIFACT_THRESHOLD = 5.0
 
 
 def neurofeedback():
@@ -18,70 +24,59 @@ def neurofeedback():
     stream.start()
     input("press enter when stream starts...")
 
-    filters = [
-        BandPassFilter((12, 32), stream.get_sampling_rate())
-        for _ in range(stream.get_channels_count())
-    ]
+    bandpass = MultiChannelFilter(
+        (12, 32), stream.get_sampling_rate(), stream.get_channels_count()
+    )
 
-    data = []
+    spectrum = SpectrumEstimator(
+        stream.get_sampling_rate(), stream.get_channels_count(), cutoff=35
+    )
 
-    window = stream.get_sampling_rate() * 10
-    stats = utils.RunningStats()
+    var_channel = 1
     prev_alpha = None
+    alpha_stats = ExponentialChunkStats(1, NORMALIZATION_ALPHA)
+
+    def on_alpha_power(feature):
+        """Print direction in which log alpha power changes, and its z-score
+        relative to recent features. Windows with artifacts are skipped.
+        """
+        nonlocal prev_alpha
+        if feature["artifact"][var_channel]:
+            print("ARTIFACT")
+            return
+        alpha = numpy.log10(feature["power"][0, var_channel])
+        alpha_stats.push(alpha)
+        if prev_alpha is not None:
+            direction = "0"
+            if alpha > prev_alpha:
+                direction = "UP"
+            if alpha < prev_alpha:
+                direction = "DOWN"
+            deviation = alpha_stats.standard_deviation()[0] or 1.0
+            zscore = (alpha - alpha_stats.mean()[0]) / deviation
+            print(f"{direction} {alpha} z={zscore:.2f}")
+        prev_alpha = alpha
+
+    engine = BandPowerEngine(
+        stream.get_sampling_rate(),
+        stream.get_channels_count(),
+        {"alpha": (8, 12)},
+        artifact_threshold=ARTIFACT_THRESHOLD,
+    )
+    engine.subscribe(on_alpha_power)
 
     # Ignore first batch as its likely empty
     stream.pull_chunk()
 
     def data_source():
-        nonlocal data
-        nonlocal window
-        nonlocal stream
-        nonlocal filters
-        nonlocal stats
-        nonlocal prev_alpha
+        eeg, ts = stream.pull_chunk()
+        eeg = numpy.asarray(eeg)
 
-        var_channel = 1
+        spectrum.push(bandpass.apply(eeg))
+        engine.process(eeg, ts)
 
-        eeg, ts = stream.pull_chunk()
-        eeg = numpy.transpose(eeg)
-
-        data.extend(
-            numpy.transpose(
-                [bandpass.apply(channel) for channel, bandpass in zip(eeg, filters)]
-            )
-        )
-
-        if len(data) > window:
-            data = data[-window:]
-
-        try:
-            print("computing spectrum...")
-            return compute_spectrum(
-                numpy.transpose(data)[var_channel], stream.get_sampling_rate(), 35
-            )
-        except Exception as e:
-            print(e)
-            return None
-
-        try:
-            for x in eeg[var_channel]:
-                stats.push(x)
-            alpha = numpy.log10(stats.variance())
-
-            if prev_alpha is not None:
-                direction = "0"
-                if alpha > prev_alpha:
-                    direction = "UP"
-                if alpha < prev_alpha:
-                    direction = "DOWN"
-
-                print(f"{direction} {alpha}")
-            prev_alpha = alpha
-
-        except Exception as e:
-            print(e)
-
-        return numpy.transpose(data)
+        freq, amplitude = spectrum.spectrum()
+        return freq, amplitude[:, var_channel]
 
     plotter = SignalPlotter(["TP9 spectrum"], data_source)
     # plotter = SignalPlotter(["TP9", "AF7", "AF8", "TP10", "AUX"], data_source)
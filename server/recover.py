@@ -0,0 +1,67 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Rebuilds DataFrame files from a session journal, e.g. after a crash.
+    Items that were already exported are skipped.
+"""
+
+import os
+import argparse
+
+from server import exporter
+from server import journal
+
+
+def recover_journal(path, output_dir, fmt="json"):
+    """Save playback items recorded in the journal as DataFrame files.
+    Items exported by the session in any of the formats are skipped.
+    Returns list of created files.
+    """
+    created = []
+    for item in journal.recover(path):
+        timestamp, suffix = item["markers"]["end"], ""
+        if timestamp is None:
+            # Unfinished item starts when the previous one ends, the suffix
+            # keeps it from being taken for the previous, exported item.
+            timestamp, suffix = item["markers"]["start"], "_unfinished"
+        name = f"{timestamp}{suffix}"
+        if item["deviceid"] is not None:
+            name = f"{timestamp}_{item['deviceid']}{suffix}"
+        name = os.path.join(output_dir, name)
+        if any(os.path.exists(name + ext) for ext in exporter.FORMATS.values()):
+            continue
+
+        filename = name + exporter.FORMATS[fmt]
+
+        data, timestamps = item["eeg"]
+        data_frame = exporter.DataFrame(
+            item["playback"],
+            data,
+            item["markers"],
+            item["label"],
+            item["userid"],
+            item["sensors"] or None,
+            None,
+            item["deviceid"],
+            timestamps,
+        )
+        data_frame.save(filename, fmt)
+        created.append(filename)
+    return created
+
+
+def main():
+    """Run recovery."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("journal")
+    parser.add_argument("--output", help="defaults to the journal directory")
+    parser.add_argument("--format", choices=exporter.FORMATS, default="json")
+
+    args = parser.parse_args()
+    output_dir = args.output or os.path.dirname(os.path.abspath(args.journal))
+
+    for filename in recover_journal(args.journal, output_dir, args.format):
+        print(f"Recovered {filename}")
+
+
+if __name__ == "__main__":
+    main()
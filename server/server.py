@@ -12,7 +12,7 @@ import sys
 from server.logger import logger
 import server.configuration as configuration
 
-from server import muse
+from server import devices
 from server import session
 
 import server.spotify.api
@@ -24,9 +24,7 @@ g_server.debug = True
 CORS(g_server)
 
 
-g_stream = None
-g_collector = None
-g_session = None
+g_devices = devices.DeviceRegistry.from_configuration(configuration.muse)
 
 
 @g_server.route("/user/<userid>/config")
@@ -121,137 +119,174 @@ def spotify_auth_callback():
     return {}, 200
 
 
-@g_server.route("/muse/connect")
-def on_muse_connect():
-    """Connect to Muse device specified in the configuration and setup LSL stream."""
-    global g_stream
-    global g_collector
+def _get_device(device_id):
+    """Return registered device, or None after logging an error."""
+    device = g_devices.get(device_id)
+    if device is None:
+        logger.error(f"Device {device_id} is not registered.")
+    return device
 
-    logger.info(f"Attempting connection to Muse 2 device.")
 
-    if g_stream is None:
-        g_stream = muse.Stream(configuration.muse.get_address())
+@g_server.route("/muse/devices")
+def on_muse_devices():
+    """Get status of all registered Muse devices."""
+    logger.info("Requesting status of all muse devices.")
+    response = {device.device_id: device.get_status() for device in g_devices}
+    return response, 200
 
-    g_stream.start()
-    return {}, 200
 
+@g_server.route("/muse/connect", defaults={"device_id": None})
+@g_server.route("/muse/<device_id>/connect")
+def on_muse_connect(device_id):
+    """Connect to Muse device specified in the configuration and setup LSL stream.
+    Returns without waiting for the stream, its readiness is reported by status.
+    """
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
+
+    logger.info(f"Attempting connection to Muse 2 device {device.device_id}.")
+    device.connect(wait=False)
+    return {"status": "connecting"}, 200
 
-@g_server.route("/muse/start")
-def on_muse_start_stream():
-    """Connect to the Muse LSL stream."""
-    global g_collector
-    global g_stream
 
-    if g_collector is None:
-        g_collector = muse.DataCollector(g_stream)
+@g_server.route("/muse/start", defaults={"device_id": None})
+@g_server.route("/muse/<device_id>/start")
+def on_muse_start_stream(device_id):
+    """Connect to the Muse LSL stream."""
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    if g_stream is None or not g_stream.is_running():
+    if not device.is_streaming():
         logger.error("There is no active LSL stream.")
         return {
             "error": "Muse needs to be connected before streaming is possible."
         }, 400
 
-    logger.info("Starting data collector.")
-    g_collector.start()
+    logger.info(f"Starting data collector for {device.device_id}.")
+    device.start_collector(in_process=g_devices.use_process_collectors())
 
     return {}, 200
 
 
-@g_server.route("/muse/stop")
-def on_muse_stop_stream():
+@g_server.route("/muse/stop", defaults={"device_id": None})
+@g_server.route("/muse/<device_id>/stop")
+def on_muse_stop_stream(device_id):
     """Disconnect from the LSL stream."""
-    global g_collector
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    if g_collector is None:
+    if device.collector is None:
         logger.error("There is no active LSL stream.")
         return {"error": "Muse is not connected."}, 400
 
-    logger.info("Stopping data collection.")
-    g_collector.stop()
-    g_collector = None
+    logger.info(f"Stopping data collection for {device.device_id}.")
+    device.stop_collector()
 
     return {}, 200
 
 
-@g_server.route("/muse/disconnect")
-def on_muse_disconnect():
+@g_server.route("/muse/disconnect", defaults={"device_id": None})
+@g_server.route("/muse/<device_id>/disconnect")
+def on_muse_disconnect(device_id):
     """Disconnect from Muse device and destroy LSL stream."""
-    global g_stream
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    if g_stream is None:
+    if device.stream is None:
         logger.error("There is no active LSL stream.")
         return {"error": "Muse is not connected."}, 400
 
-    logger.info("Disconnecting muse device.")
-    g_stream.stop()
-    g_stream = None
+    logger.info(f"Disconnecting muse device {device.device_id}.")
+    device.disconnect()
 
     return {}, 200
 
 
-@g_server.route("/muse/status")
-def on_muse_status():
+@g_server.route("/muse/status", defaults={"device_id": None})
+@g_server.route("/muse/<device_id>/status")
+def on_muse_status(device_id):
     """Get Muse and LSL stream connection status."""
-    global g_stream
-    global g_collector
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    logger.info("Requesting muse device status.")
-    response = {
-        "stream": g_stream is not None and g_stream.is_running(),
-        "collector": g_collector is not None and g_collector.is_running(),
-    }
+    logger.info(f"Requesting muse device {device.device_id} status.")
+    return device.get_status(), 200
 
-    return response, 200
+
+@g_server.route("/muse/features", defaults={"device_id": None})
+@g_server.route("/muse/<device_id>/features")
+def on_muse_features(device_id):
+    """Get the latest band powers of each channel."""
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
+
+    feature = device.get_features()
+    if feature is None:
+        return {"error": "No features were computed yet."}, 400
+
+    return feature, 200
 
 
-@g_server.route("/session/start")
-def on_session_start():
+@g_server.route("/session/start", defaults={"device_id": None})
+@g_server.route("/session/<device_id>/start")
+def on_session_start(device_id):
     """Start data collection session."""
-    global g_session
-    global g_stream
-    global g_collector
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    logger.info("Starting session.")
+    logger.info(f"Starting session for {device.device_id}.")
     if configuration.spotify.get_token() is None:
         return {"error": "Spotify access token unavailable. Connect to Spotify."}, 400
 
-    if g_stream is None or not g_stream.is_running():
+    if not device.is_streaming():
         return {"error": "Muse is not connected. Connect to Muse."}, 400
 
-    if g_collector is None:
+    if device.collector is None:
         return {"error": "Data collection needs to be started first."}, 400
 
-    g_session = session.Session(g_collector)
-    g_session.start()
+    device.start_session()
 
     return {}, 200
 
 
-@g_server.route("/session/stop")
-def on_session_stop():
+@g_server.route("/session/stop", defaults={"device_id": None})
+@g_server.route("/session/<device_id>/stop")
+def on_session_stop(device_id):
     """Stop data collection session."""
-    global g_session
-    logger.info("Stopping session.")
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    if g_session is None:
+    logger.info(f"Stopping session for {device.device_id}.")
+    if device.session is None:
         return {"error": "No active session exists."}, 400
 
-    g_session.stop()
+    device.stop_session()
     return {}, 200
 
 
-@g_server.route("/session/label/<label>")
-def on_session_label(label):
+@g_server.route("/session/label/<label>", defaults={"device_id": None})
+@g_server.route("/session/<device_id>/label/<label>")
+def on_session_label(device_id, label):
     """This function does the same thing as on_mark() endpoint, but using a different url.
     Additionally, if there is an active session it sets label for that session.
     """
-    logger.info(f"Labeling current song in a session as {label}.")
+    device = _get_device(device_id)
+    if device is None:
+        return {"error": f"Unknown device {device_id}."}, 404
 
-    global g_session
-    if g_session is None:
+    logger.info(f"Labeling current song in a {device.device_id} session as {label}.")
+    if device.session is None:
         return {"error": "No active session exists."}, 400
 
-    g_session.set_label(label)
+    device.session.set_label(label)
     return {}, 200
 
 
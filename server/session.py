@@ -9,6 +9,8 @@ from server import configuration
 
 from server import monitor
 from server import exporter
+from server import journal
+from server import catalog
 from server import spotify
 
 
@@ -36,20 +38,50 @@ def _add_item_to_eeg_playlist(item, label):
 
 
 class Session:
-    """Data collection session."""
+    """Data collection session.
 
-    def __init__(self, collector):
-        """Initialize session."""
+    In continuous mode collector is never cleared, instead each playback item
+    is tracked as a [start; end) range of sample indices in collector's buffer,
+    which is only read when the item is exported.
+
+    Data frames are saved by a background ExportWriter, so that playback
+    monitoring is not delayed by exporting, and indexed in the catalog of
+    session data directory.
+
+    Collected samples and playback events are also periodically appended to
+    a journal, see journal.py, from which data can be recovered after a crash.
+    """
+
+    def __init__(self, collector, continuous=False, device_id=None):
+        """Initialize session.
+        device_id: id of the Muse device, used to tag exported data.
+        """
         self.monitor = monitor.PlaybackMonitor(
             lambda old, new, ts: self.on_playback_change(old, new, ts)
         )
         self.collector = collector
+        self.continuous = continuous
+        self.device_id = device_id
+        self.segment = [None, None]
+        self.catalog = None
+        if configuration.app.get_catalog():
+            self.catalog = catalog.Catalog(configuration.app.get_session_data_dir())
+        self.writer = exporter.ExportWriter(
+            configuration.app.get_export_queue_size(),
+            on_error=lambda path, error: logger.error(
+                f"Exporting data to {path} failed: {error}"
+            ),
+            catalog=self.catalog,
+        )
+        self.journal = None
+        self.journal_writer = None
         self.reset()
         self.userid = 0
 
     def reset(self):
         """Reset Collected data."""
-        self.collector.clear()
+        if not self.continuous:
+            self.collector.clear()
         self.label = None
         self.markers = {"start": None, "end": None, "labeling": None}
 
@@ -66,50 +98,129 @@ class Session:
         else:
             self.on_playback_next(old, new, timestamp)
 
-    def on_playback_started(self, _playback_info, timestamp):
+    def on_playback_started(self, playback_info, timestamp):
         """Callback triggered when playback starts."""
         logger.info("Playback has started.")
         self.reset()
         self.markers["start"] = timestamp
+        self.segment = [self.collector.get_index(timestamp), None]
+        self._journal_event("start", timestamp, playback=playback_info)
 
     def on_playback_stopped(self, _playback_info, timestamp):
         """Callback triggered when playback stops."""
         # TODO: data is not saved when playback stops.
         logger.info("Playback stopped.")
         self.markers["end"] = timestamp
+        self.segment[1] = self.collector.get_index(timestamp)
+        self._journal_event("end", timestamp)
 
-    def on_playback_next(self, old, _new, timestamp):
+    def on_playback_next(self, old, new, timestamp):
         """Callback triggered when playback item is changed."""
         logger.info("New playback item.")
         self.markers["end"] = timestamp
+        self.segment[1] = self.collector.get_index(timestamp)
+        self._journal_event("end", timestamp)
+        self._journal_event("start", timestamp, playback=new)
         data_frame = self._build_data_frame(old)
-        path = os.path.join(
-            configuration.app.get_session_data_dir(), f"{timestamp}.json"
-        )
-        data_frame.save(path)
+        extension = exporter.FORMATS[configuration.app.get_export_format()]
+        filename = f"{timestamp}{extension}"
+        if self.device_id is not None:
+            filename = f"{timestamp}_{self.device_id}{extension}"
+        path = os.path.join(configuration.app.get_session_data_dir(), filename)
+        self.writer.submit(data_frame, path, codec=configuration.app.get_export_codec())
         self.reset()
         self.markers["start"] = timestamp
+        self.segment = [self.segment[1], None]
 
     def set_label(self, label):
         """Label current playback and add to corresponding playlist."""
         self.label = label
         self.markers["labeling"] = datetime.now()
+        self._journal_event("label", self.markers["labeling"], label=label)
         _add_item_to_eeg_playlist(self.monitor.playback_info, label)
 
     def start(self):
         """Start monitoring for playback changes."""
+        self.writer.start()
+        interval = configuration.app.get_journal_interval()
+        if interval:
+            self._start_journal(interval)
         self.monitor.start()
 
     def stop(self):
-        """Stop monitoring playback changes."""
+        """Stop monitoring playback changes, and wait until all collected
+        data is exported.
+        """
         self.monitor.stop()
+        if self.monitor.is_alive():
+            self.monitor.join()
+        if self.writer.is_alive():
+            self.writer.stop()
+        if self.catalog is not None:
+            self.catalog.close()
+        if self.journal is not None:
+            self.journal_writer.stop()
+            self.journal.close()
+            logger.info(f"Session journal saved to {self.journal.path}.")
+        logger.info(f"Export metrics: {self.writer.get_metrics()}")
+
+    def _start_journal(self, interval):
+        """Start journaling collected samples every interval seconds."""
+        name = f"{datetime.now()}.journal"
+        if self.device_id is not None:
+            name = f"{datetime.now()}_{self.device_id}.journal"
+        path = os.path.join(configuration.app.get_session_data_dir(), name)
+        self.journal = journal.Journal(path)
+        self.journal.append_event(
+            {"type": "session", "userid": self.userid, "deviceid": self.device_id}
+        )
+        self.journal_writer = journal.JournalWriter(
+            self.journal, self.collector, interval
+        )
+        self.journal_writer.start()
+
+    def _journal_event(self, event_type, timestamp, **fields):
+        """Append playback event to the journal, with the corresponding
+        stream timestamp used to find samples during recovery.
+        """
+        if self.journal is None:
+            return
+        event = {
+            "type": event_type,
+            "timestamp": timestamp,
+            "stream_time": self.collector.to_stream_time(timestamp),
+        }
+        event.update(fields)
+        self.journal.append_event(event)
 
     def _build_data_frame(self, playback_info):
-        """Create a DataFrame with collected data."""
+        """Create a DataFrame with data collected between start and end markers."""
+        if self.continuous:
+            data, timestamps = self.collector.get_range(*self.segment)
+        else:
+            data, timestamps = self.collector.get_segment(
+                self.markers["start"], self.markers["end"]
+            )
+
+        sensors = None
+        if len(timestamps) > 0:
+            # Same bounds as EEG segment, so that samples recorded at the last
+            # EEG timestamp are not dropped by the exclusive end.
+            sensors = self.collector.get_sensors(
+                self.markers["start"], self.markers["end"]
+            )
+        gaps = self.collector.find_gaps(timestamps)
+        if gaps:
+            logger.warning(f"Exported data contains {len(gaps)} gaps.")
+
         return exporter.DataFrame(
             playback_info,
-            self.collector.get_data(),
+            data,
             self.markers,
             self.label,
             self.userid,
+            sensors or None,
+            gaps,
+            self.device_id,
+            timestamps,
         )
@@ -0,0 +1,251 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for buffers.py module.
+"""
+
+import unittest
+import tempfile
+from unittest import mock
+
+import numpy as np
+
+from buffers import RingBuffer, SharedRingBuffer, MappedBuffer, find_gaps
+
+
+class TestFindGaps(unittest.TestCase):
+    """Test find_gaps function."""
+
+    def test_find_gaps(self):
+        """Test that only intervals over tolerance are reported as gaps."""
+        timestamps = np.concatenate(
+            [np.arange(0, 100), np.arange(103, 150), np.arange(250, 300)]
+        ) / 256.0
+        gaps = find_gaps(timestamps, 256)
+        self.assertEqual(len(gaps), 1)
+        self.assertEqual(gaps[0]["index"], 147)
+        self.assertEqual(gaps[0]["missing"], 100)
+        self.assertAlmostEqual(gaps[0]["start"], 149 / 256.0)
+        self.assertEqual(find_gaps(timestamps[:10], 256), [])
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Test RingBuffer class."""
+
+    def make_chunk(self, start, count, channels=4):
+        """Create chunk of samples with values equal to their absolute index."""
+        index = np.arange(start, start + count, dtype=np.float64)
+        return np.repeat(index[:, None], channels, axis=1), index
+
+    def test_write(self):
+        """Test writing less samples than capacity."""
+        buffer = RingBuffer(10, 4)
+        buffer.write(*self.make_chunk(0, 6))
+        self.assertEqual(len(buffer), 6)
+        self.assertEqual(buffer.get_data().shape, (6, 4))
+        self.assertTrue((buffer.get_timestamps() == np.arange(6)).all())
+
+    def test_wrap_around(self):
+        """Test that oldest samples are overwritten and data stays contiguous."""
+        buffer = RingBuffer(10, 4)
+        for start in range(0, 25, 5):
+            buffer.write(*self.make_chunk(start, 5))
+
+        data = buffer.get_data()
+        self.assertEqual(len(buffer), 10)
+        self.assertTrue(data.flags["C_CONTIGUOUS"])
+        self.assertTrue((data[:, 0] == np.arange(15, 25)).all())
+        self.assertTrue((buffer.get_timestamps() == np.arange(15, 25)).all())
+
+    def test_chunk_larger_than_capacity(self):
+        """Test writing a single chunk that does not fit in the buffer."""
+        buffer = RingBuffer(10, 4)
+        buffer.write(*self.make_chunk(0, 3))
+        buffer.write(*self.make_chunk(3, 25))
+        self.assertEqual(buffer.written, 28)
+        self.assertTrue((buffer.get_timestamps() == np.arange(18, 28)).all())
+
+    def test_view(self):
+        """Test accessing samples by absolute index."""
+        buffer = RingBuffer(10, 4)
+        buffer.write(*self.make_chunk(0, 17))
+        data, timestamps = buffer.view(9, 14)
+        self.assertTrue((timestamps == np.arange(9, 14)).all())
+        self.assertTrue((data[:, 3] == np.arange(9, 14)).all())
+
+        _, timestamps = buffer.view(0, 9)
+        self.assertTrue((timestamps == np.arange(7, 9)).all())
+
+    def test_reserve_commit(self):
+        """Test placing samples directly in reserved storage."""
+        buffer = RingBuffer(10, 4)
+        buffer.write(*self.make_chunk(0, 8))
+        data, timestamps = self.make_chunk(8, 5)
+
+        destination = buffer.reserve(5)
+        self.assertEqual(len(destination), 2)
+        self.assertEqual(buffer.first_index(), 0)
+        destination[:] = data[:2]
+        buffer.commit(timestamps[:2])
+
+        destination = buffer.reserve(3)
+        self.assertEqual(buffer.first_index(), 3)
+        destination[:] = data[2:]
+        buffer.commit(timestamps[2:])
+
+        self.assertTrue((buffer.get_data()[:, 1] == np.arange(3, 13)).all())
+        self.assertTrue((buffer.get_timestamps() == np.arange(3, 13)).all())
+
+    def test_reserve_wrap_around(self):
+        """Test that reserving storage in every poll, also when nothing is
+        committed, keeps capacity samples once the buffer wraps.
+        """
+        shared = SharedRingBuffer(10, 4, reserve_size=4)
+        for buffer in (RingBuffer(10, 4, reserve_size=4), shared):
+            written = 0
+            for count in [3, 0, 4, 1, 0, 4, 2, 0, 3, 4, 4, 0, 1]:
+                destination = buffer.reserve(4)
+                count = min(count, len(destination))
+                data, timestamps = self.make_chunk(written, count)
+                destination[:count] = data
+                buffer.commit(timestamps)
+                written += count
+
+                self.assertEqual(len(buffer), min(written, 10))
+                expected = np.arange(max(0, written - 10), written)
+                self.assertTrue((buffer.get_data()[:, 2] == expected).all())
+                self.assertTrue((buffer.get_timestamps() == expected).all())
+        shared.close()
+        shared.unlink()
+
+    def test_search(self):
+        """Test mapping timestamps to absolute indices."""
+        buffer = RingBuffer(10, 4)
+        buffer.write(*self.make_chunk(0, 17))
+        self.assertEqual(buffer.search(10), 10)
+        self.assertEqual(buffer.search(10.5), 11)
+        self.assertEqual(buffer.search(10, side="right"), 11)
+        self.assertEqual(buffer.search(0), 7)
+        self.assertEqual(buffer.search(100), 17)
+
+    def test_clear(self):
+        """Test clearing buffer without losing the write position."""
+        buffer = RingBuffer(10, 4)
+        buffer.write(*self.make_chunk(0, 7))
+        buffer.clear()
+        self.assertEqual(len(buffer), 0)
+        buffer.write(*self.make_chunk(7, 2))
+        self.assertTrue((buffer.get_timestamps() == [7, 8]).all())
+
+
+class TestSharedRingBuffer(unittest.TestCase):
+    """Test SharedRingBuffer class."""
+
+    def setUp(self):
+        self.writer = SharedRingBuffer(10, 2)
+        self.reader = SharedRingBuffer(10, 2, name=self.writer.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        self.writer.unlink()
+
+    def write(self, start, count):
+        index = np.arange(start, start + count, dtype=np.float64)
+        self.writer.write(np.repeat(index[:, None], 2, axis=1), index)
+
+    def test_attach(self):
+        """Test that samples written by one instance are read by another."""
+        self.write(0, 14)
+        self.assertEqual(self.reader.written, 14)
+        data, timestamps = self.reader.read()
+        self.assertTrue((timestamps == np.arange(4, 14)).all())
+        self.assertTrue((data[:, 1] == np.arange(4, 14)).all())
+
+    def test_read_drops_overwritten(self):
+        """Test that samples the writer started to overwrite are not read."""
+        self.write(0, 20)
+        destination = self.writer.reserve(4)
+        destination[:] = -1.0
+
+        data, timestamps = self.reader.read()
+        self.assertTrue((timestamps == np.arange(14, 20)).all())
+        self.assertTrue((data[:, 0] == np.arange(14, 20)).all())
+        self.assertFalse(self.reader.is_valid(13))
+
+        self.writer.commit(np.arange(20.0, 24.0))
+        _, timestamps = self.reader.read()
+        self.assertTrue((timestamps == np.arange(14, 24)).all())
+
+    def test_read_while_writing(self):
+        """Test that samples overwritten while the reader copies them are
+        dropped, and the copy is retried from the oldest valid sample.
+        """
+        self.write(0, 10)
+        copy = RingBuffer.read
+        copies = []
+
+        def read(buffer, start, end):
+            result = copy(buffer, start, end)
+            if not copies:
+                self.write(10, 5)
+            copies.append((start, end))
+            return result
+
+        with mock.patch.object(RingBuffer, "read", autospec=True, side_effect=read):
+            data, timestamps = self.reader.read(0, 10)
+        self.assertEqual(copies, [(0, 10), (5, 10)])
+        self.assertTrue((timestamps == np.arange(5, 10)).all())
+        self.assertTrue((data[:, 0] == np.arange(5, 10)).all())
+
+
+class TestMappedBuffer(unittest.TestCase):
+    """Test MappedBuffer class."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_chunk(self, start, count, channels=4):
+        """Create chunk of samples with values equal to their absolute index."""
+        index = np.arange(start + 1, start + count + 1, dtype=np.float64)
+        return np.repeat(index[:, None], channels, axis=1), index
+
+    def test_grow(self):
+        """Test that files grow in whole extents."""
+        buffer = MappedBuffer(self.directory.name, 4, extent=8)
+        for start in range(0, 20, 5):
+            buffer.write(*self.make_chunk(start, 5))
+
+        self.assertEqual(buffer.allocated, 24)
+        self.assertEqual(len(buffer), 20)
+        self.assertIsInstance(buffer.get_data(), np.memmap)
+        self.assertTrue((buffer.get_timestamps() == np.arange(1, 21)).all())
+        self.assertEqual(buffer.search(10), 9)
+
+    def test_reserve_commit(self):
+        """Test placing samples directly in mapped storage."""
+        buffer = MappedBuffer(self.directory.name, 4, extent=8)
+        data, timestamps = self.make_chunk(0, 10)
+        destination = buffer.reserve(16)
+        destination[:10] = data
+        buffer.commit(timestamps)
+        self.assertTrue((buffer.get_data() == data).all())
+
+    def test_open(self):
+        """Test recovering samples that were not flushed."""
+        buffer = MappedBuffer(self.directory.name, 4, extent=8)
+        buffer.write(*self.make_chunk(0, 5))
+        buffer.flush()
+        buffer.write(*self.make_chunk(5, 6))
+        buffer.data.flush()
+        buffer.timestamps.flush()
+
+        recovered = MappedBuffer.open(self.directory.name)
+        self.assertEqual(len(recovered), 11)
+        self.assertTrue((recovered.get_data()[:, 2] == np.arange(1, 12)).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
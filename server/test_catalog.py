@@ -0,0 +1,86 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for catalog.py module.
+"""
+
+import unittest
+import os
+import json
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from catalog import Catalog
+from exporter import DataFrame
+
+
+class TestCatalog(unittest.TestCase):
+    """Test Catalog class."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.catalog = Catalog(self.directory.name)
+
+    def tearDown(self):
+        self.catalog.close()
+        self.directory.cleanup()
+
+    def save(self, name, label, userid=0, fmt=None):
+        playback = {"uri": f"spotify:track:{name}", "artists": "A", "song": name}
+        timestamps = {"start": datetime.now(), "end": None, "labeling": None}
+        data_frame = DataFrame(playback, np.zeros((30, 5)), timestamps, label, userid)
+        path = os.path.join(self.directory.name, f"{name}.json")
+        data_frame.save(path, fmt, catalog=self.catalog)
+        return path
+
+    def test_add(self):
+        """Test that saved DataFrames are indexed."""
+        self.save("a", "like")
+        self.save("b", "like", userid=1)
+        self.save("c", "meh")
+        self.assertEqual(self.catalog.count("label"), {"like": 2, "meh": 1})
+
+        rows = self.catalog.query(label="like", userid="1")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["song"], "b")
+        self.assertEqual((rows[0]["samples"], rows[0]["channels"]), (30, 5))
+        self.assertTrue(os.path.isfile(rows[0]["path"]))
+        self.assertRaises(ValueError, self.catalog.query, eeg=1)
+
+    def test_rebuild(self):
+        """Test rebuilding catalog from files in the directory."""
+        path = self.save("a", "like")
+        self.save("b", "meh")
+        os.remove(path)
+        self.catalog.rebuild(lambda path: DataFrame.load(path, lazy=True))
+        self.assertEqual(len(self.catalog), 1)
+        self.assertEqual(self.catalog.count("label"), {"meh": 1})
+
+    def test_rebuild_legacy(self):
+        """Test indexing legacy json file, with eeg data pickled as a list of
+        tuples and without its shape, and skipping a corrupt file.
+        """
+        data_frame = DataFrame({}, None, {"start": None}, "like", 0)
+        legacy = {
+            "userid": 0,
+            "playback": {},
+            "label": "like",
+            "timestamps": {"start": None},
+            "eeg": data_frame._serialize([(0.0,) * 5] * 12),
+        }
+        with open(os.path.join(self.directory.name, "legacy.json"), "w") as f:
+            json.dump(legacy, f)
+        with open(os.path.join(self.directory.name, "corrupt.json"), "w") as f:
+            f.write('{"userid": 0, "eeg": "')
+
+        skipped = self.catalog.rebuild(lambda path: DataFrame.load(path, lazy=True))
+        names = [os.path.basename(path) for path, _ in skipped]
+        self.assertEqual(names, ["corrupt.json"])
+        rows = self.catalog.query()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]["samples"], rows[0]["channels"]), (12, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for data/dataset.py module.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# dataset.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import exporter  # noqa: E402
+from server.data import dataset  # noqa: E402
+
+
+START = datetime(2021, 9, 7, 10, 0, 0)
+
+
+def make_data_frame(labeling=6.5, label="like", eeg_timestamps=None):
+    """Create 10 s recording of 2 channels sampled at 10 Hz, with values equal
+    to sample indices, labeled given number of seconds after the start.
+    """
+    markers = {"start": START, "end": START + timedelta(seconds=10)}
+    markers["labeling"] = None
+    if labeling is not None:
+        markers["labeling"] = START + timedelta(seconds=labeling)
+    eeg_data = np.repeat(np.arange(100, dtype=np.float32)[:, None], 2, axis=1)
+    return exporter.DataFrame(
+        {"artists": "A", "song": "B", "uri": "C"},
+        eeg_data,
+        markers,
+        label,
+        1,
+        eeg_timestamps=eeg_timestamps,
+    )
+
+
+class TestCutEpoch(unittest.TestCase):
+    """Test cutting epochs around markers."""
+
+    def cut(self, data_frame, offset=-2.0):
+        return dataset.cut_epoch(data_frame, offset=offset, window=2.0, fs=10)
+
+    def test_cut(self):
+        """Test epoch located by sample index, and by timestamps across a gap."""
+        epoch = self.cut(make_data_frame())
+        self.assertEqual(epoch.shape, (2, 20))
+        self.assertTrue((epoch[0] == np.arange(45, 65)).all())
+
+        # Samples from 3.0 s to 3.9 s are missing, so the epoch starting
+        # at 4.5 s begins 10 samples earlier than its index without gaps.
+        seconds = np.concatenate([np.arange(0, 30), np.arange(40, 110)]) / 10
+        epoch = self.cut(make_data_frame(eeg_timestamps=100 + seconds))
+        self.assertTrue((epoch[1] == np.arange(35, 55)).all())
+
+    def test_out_of_range(self):
+        """Test that epochs not fully within the recording are rejected."""
+        seconds = 100 + np.arange(100) / 10
+        for eeg_timestamps in (None, seconds):
+            data_frame = make_data_frame(eeg_timestamps=eeg_timestamps)
+            self.assertIsNone(self.cut(data_frame, offset=-7.0))
+            self.assertIsNone(self.cut(data_frame, offset=2.0))
+            self.assertIsNotNone(self.cut(data_frame, offset=-6.5))
+            self.assertIsNotNone(self.cut(data_frame, offset=1.5))
+        self.assertIsNone(self.cut(make_data_frame(labeling=None)))
+
+
+class TestBuild(unittest.TestCase):
+    """Test building and loading training sets."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.directory.name, "set")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def build(self):
+        return dataset.build(
+            self.directory.name, self.output, window=2.0, fs=10, channels=2
+        )
+
+    def test_build_load(self):
+        """Test that epochs of valid recordings are saved and memory mapped,
+        and unreadable files and recordings without an epoch are skipped.
+        """
+        make_data_frame(label="like").save(self.path("a.json"))
+        make_data_frame(labeling=None).save(self.path("b.bin"))
+        make_data_frame(labeling=5.0, label="meh").save(self.path("c.bin"))
+        with open(self.path("d.json"), "w", encoding="utf-8") as f:
+            f.write('{"userid": 1, "label": "like"')
+
+        count, skipped = self.build()
+        self.assertEqual(count, 2)
+        self.assertEqual([path for path, _ in skipped], [self.path("d.json")])
+
+        header, X, y, metadata = dataset.load(self.output)
+        self.assertIsInstance(X, np.memmap)
+        self.assertEqual(X.shape, (2, 2, 20))
+        self.assertEqual(header["labels"], ["like", "meh"])
+        self.assertEqual(y.tolist(), [0, 1])
+        self.assertTrue((X[0, 0] == np.arange(45, 65)).all())
+        self.assertTrue((X[1, 1] == np.arange(30, 50)).all())
+        self.assertEqual([item["file"] for item in metadata], ["a.json", "c.bin"])
+        self.assertEqual(metadata[1]["song"], "B")
+
+    def test_build_empty(self):
+        """Test training set of a directory without recordings."""
+        self.assertEqual(self.build(), (0, []))
+        header, X, y, metadata = dataset.load(self.output)
+        self.assertEqual(X.shape, (0, 2, 20))
+        self.assertEqual((len(y), metadata), (0, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
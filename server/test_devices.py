@@ -0,0 +1,105 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for devices.py module.
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+# devices.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from server import configuration  # noqa: E402
+    from server import devices  # noqa: E402
+except (ModuleNotFoundError, FileNotFoundError):
+    # configuration.py requires server/secret.py and configuration files,
+    # which are not distributed.
+    devices = None
+
+
+@unittest.skipIf(devices is None, "configuration is not available.")
+class TestDeviceRegistry(unittest.TestCase):
+    """Test DeviceRegistry class."""
+
+    def setUp(self):
+        self.app = configuration.app
+        configuration.app = configuration.App()
+
+    def tearDown(self):
+        configuration.app = self.app
+
+    def test_add_get(self):
+        """Test that devices are found by id, and the first one by default."""
+        registry = devices.DeviceRegistry()
+        self.assertIsNone(registry.get())
+        first = registry.add("a", "00:00:01", ("PPG",))
+        self.assertFalse(registry.use_process_collectors())
+        second = registry.add("b", "00:00:02")
+
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(list(registry), [first, second])
+        self.assertIs(registry.get(), first)
+        self.assertIs(registry.get("b"), second)
+        self.assertIsNone(registry.get("c"))
+        self.assertEqual(second.address, "00:00:02")
+        self.assertEqual(first.sensors, ("PPG",))
+        self.assertTrue(registry.use_process_collectors())
+
+    def test_from_configuration(self):
+        """Test registry of configured devices, or of the single Muse."""
+        muse_config = configuration.Muse()
+        muse_config.set_address("00:00:01")
+        registry = devices.DeviceRegistry.from_configuration(muse_config)
+        self.assertEqual(registry.get().device_id, configuration.DEFAULT_DEVICE_ID)
+        self.assertEqual(registry.get().address, "00:00:01")
+
+        muse_config.set_devices({"a": "00:00:02", "b": "00:00:03"})
+        muse_config.set_sensors(["ACC"])
+        registry = devices.DeviceRegistry.from_configuration(muse_config)
+        self.assertEqual([device.device_id for device in registry], ["a", "b"])
+        self.assertEqual(registry.get("b").sensors, ["ACC"])
+
+
+@unittest.skipIf(devices is None, "configuration is not available.")
+class TestDevice(unittest.TestCase):
+    """Test Device class."""
+
+    def test_disconnect(self):
+        """Test that session and collector are stopped before the stream."""
+        device = devices.Device("a", "00:00:01")
+        calls = mock.Mock()
+        device.stream = calls.stream
+        device.collector = calls.collector
+        device.features = calls.features
+        device.session = calls.session
+
+        device.disconnect()
+        self.assertEqual(
+            calls.mock_calls,
+            [
+                mock.call.session.stop(),
+                mock.call.features.stop(),
+                mock.call.collector.stop(),
+                mock.call.stream.stop(),
+            ],
+        )
+        self.assertEqual(
+            (device.stream, device.collector, device.features, device.session),
+            (None, None, None, None),
+        )
+        self.assertFalse(device.is_streaming())
+        self.assertFalse(device.is_collecting())
+
+        # Device without collector and session only stops the stream.
+        device.stream = calls.stream
+        calls.reset_mock()
+        device.disconnect()
+        self.assertEqual(calls.mock_calls, [mock.call.stream.stop()])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,19 @@
 import unittest
 import os
+import json
+import tempfile
 
 import numpy as np
 from datetime import datetime, timedelta
 
-from exporter import DataFrame
+from exporter import (
+    DataFrame,
+    ExportWriter,
+    encode_block,
+    decode_block,
+    is_binary,
+    read_header,
+)
 
 
 class TestDataFrame(unittest.TestCase):
@@ -64,6 +73,231 @@ class TestDataFrame(unittest.TestCase):
         self.assertEqual(data_frame_2.label, data_frame.label)
         self.assertEqual(data_frame_2.timestamps, data_frame.timestamps)
         self.assertTrue((data_frame_2.eeg_data == data_frame.eeg_data).all())
+        self.assertIsNone(data_frame_2.sensors)
+        self.assertIsNone(data_frame_2.gaps)
+
+    def test_save_unknown_extension(self):
+        """Test that files with unknown extension are saved in json format."""
+        data_frame = DataFrame(
+            self.playback_info, self.eeg_data, self.timestamps, self.label, self.userid
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "frame.dat")
+            data_frame.save(filename)
+            self.assertFalse(is_binary(filename))
+            with open(filename, "r", encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["label"], self.label)
+            data_frame_2 = DataFrame.load(filename)
+        self.assertTrue((data_frame_2.eeg_data == data_frame.eeg_data).all())
+
+    def test_load_lazy(self):
+        """Test that eeg data of lazily loaded json file is decoded on access."""
+        data_frame = DataFrame(
+            self.playback_info, self.eeg_data, self.timestamps, self.label, self.userid
+        )
+        data_frame.save(self.test_file)
+        data_frame_2 = DataFrame.load(self.test_file, lazy=True)
+        self.assertEqual(data_frame_2.label, self.label)
+        self.assertIn("eeg_data", data_frame_2._loaders)
+        self.assertTrue((data_frame_2.eeg_data == self.eeg_data).all())
+        self.assertNotIn("eeg_data", data_frame_2._loaders)
+
+    def test_load_lazy_metadata(self):
+        """Test that lazy loading of json file reads only metadata, which is
+        followed by a truncated eeg payload here.
+        """
+        data_frame = DataFrame(
+            self.playback_info, self.eeg_data, self.timestamps, self.label, self.userid
+        )
+        data_frame.save(self.test_file)
+        with open(self.test_file, "r+", encoding="utf-8") as f:
+            f.truncate(f.read().index('"eeg":') + 20)
+
+        data_frame_2 = DataFrame.load(self.test_file, lazy=True)
+        self.assertEqual(data_frame_2.label, self.label)
+        self.assertEqual(data_frame_2.timestamps, self.timestamps)
+        with self.assertRaises(ValueError):
+            data_frame_2.eeg_data
+
+    def test_save_sensors(self):
+        """Test saving and loading DataFrame with sensors data and gaps."""
+        sensors = {"PPG": (np.random.rand(25, 3), np.arange(25.0))}
+        gaps = [{"start": 1.0, "end": 2.0, "index": 10, "missing": 255}]
+        data_frame = DataFrame(
+            self.playback_info,
+            self.eeg_data,
+            self.timestamps,
+            self.label,
+            self.userid,
+            sensors,
+            gaps,
+        )
+        data_frame.save(self.test_file)
+        data_frame_2 = DataFrame.load(self.test_file)
+
+        data, timestamps = data_frame_2.sensors["PPG"]
+        self.assertTrue((data == sensors["PPG"][0]).all())
+        self.assertTrue((timestamps == sensors["PPG"][1]).all())
+        self.assertEqual(data_frame_2.gaps, gaps)
+
+
+class TestBinaryDataFrame(unittest.TestCase):
+    """Test saving DataFrame in binary format."""
+
+    eeg_data = np.random.rand(100, 5).astype(np.float32)
+    eeg_timestamps = np.arange(100) / 256.0
+    sensors = {"ACC": (np.random.rand(20, 3).astype(np.float32), np.arange(20.0))}
+    playback_info = {"uri": "spotify:track:123", "song": "Test track"}
+    timestamps = {"start": datetime.now(), "end": None, "labeling": None}
+
+    test_file = "test.bin"
+
+    def tearDown(self):
+        if os.path.isfile(self.test_file):
+            os.remove(self.test_file)
+
+    def make_data_frame(self, **kwargs):
+        return DataFrame(
+            self.playback_info, self.eeg_data, self.timestamps, "like", "1", **kwargs
+        )
+
+    def test_save(self):
+        """Test saving and loading DataFrame object to a binary file."""
+        data_frame = self.make_data_frame(
+            sensors=self.sensors, deviceid="muse-1", eeg_timestamps=self.eeg_timestamps
+        )
+        data_frame.save(self.test_file)
+        self.assertTrue(is_binary(self.test_file))
+
+        data_frame_2 = DataFrame.load(self.test_file)
+        self.assertEqual(data_frame_2.playback_info, self.playback_info)
+        self.assertEqual(data_frame_2.timestamps, self.timestamps)
+        self.assertEqual(data_frame_2.deviceid, "muse-1")
+        self.assertTrue((data_frame_2.eeg_data == self.eeg_data).all())
+        self.assertTrue((data_frame_2.eeg_timestamps == self.eeg_timestamps).all())
+        data, timestamps = data_frame_2.sensors["ACC"]
+        self.assertTrue((data == self.sensors["ACC"][0]).all())
+        self.assertTrue((timestamps == self.sensors["ACC"][1]).all())
+
+    def test_save_empty(self):
+        """Test saving DataFrame without any samples."""
+        data_frame = self.make_data_frame()
+        data_frame.eeg_data = np.zeros((0, 5))
+        data_frame.save(self.test_file)
+        data_frame_2 = DataFrame.load(self.test_file)
+        self.assertEqual(data_frame_2.eeg_data.shape, (0, 5))
+        self.assertIsNone(data_frame_2.sensors)
+
+    def test_load_lazy(self):
+        """Test that data of lazily loaded DataFrame is memory mapped."""
+        data_frame = self.make_data_frame(sensors=self.sensors)
+        data_frame.save(self.test_file)
+
+        data_frame_2 = DataFrame.load(self.test_file, lazy=True)
+        self.assertEqual(data_frame_2.label, "like")
+        self.assertIn("eeg_data", data_frame_2._loaders)
+        self.assertIsInstance(data_frame_2.eeg_data, np.memmap)
+        self.assertTrue((data_frame_2.eeg_data == self.eeg_data).all())
+        self.assertIsNone(data_frame_2.eeg_timestamps)
+        self.assertTrue((data_frame_2.sensors["ACC"][1] == np.arange(20.0)).all())
+
+    def test_header(self):
+        """Test reading only the header of a binary file."""
+        self.make_data_frame().save(self.test_file)
+        header, data_start = read_header(self.test_file)
+        self.assertEqual(header["label"], "like")
+        self.assertEqual(header["blocks"][0]["shape"], [100, 5])
+        self.assertEqual(data_start % 64, 0)
+
+
+class TestCodecs(unittest.TestCase):
+    """Test compression of data blocks."""
+
+    eeg_data = np.cumsum(np.random.randn(256, 5), axis=0).astype(np.float32)
+    timestamps = 1000.0 + np.arange(256) / 256.0
+
+    def test_lossless(self):
+        """Test that delta codecs restore exact values."""
+        for codec in ("delta-zlib", "delta-lzma"):
+            for array in (self.eeg_data, self.timestamps):
+                content, params = encode_block(array, codec)
+                decoded = decode_block(content, array.dtype, array.shape, codec, params)
+                self.assertEqual(decoded.dtype, array.dtype)
+                self.assertTrue((decoded == array).all())
+
+    def test_quantized(self):
+        """Test that int16 codec error is within quantization step."""
+        content, params = encode_block(self.eeg_data, "int16-zlib")
+        decoded = decode_block(content, "<f4", (256, 5), "int16-zlib", params)
+        error = np.abs(decoded - self.eeg_data).max(axis=0)
+        self.assertTrue((error <= np.array(params["scale"])).all())
+        self.assertLess(len(content), self.eeg_data.nbytes / 2)
+
+    def test_save(self):
+        """Test saving and loading compressed DataFrame in both formats."""
+        data_frame = DataFrame(
+            {},
+            self.eeg_data,
+            {"start": None},
+            "meh",
+            "1",
+            eeg_timestamps=self.timestamps,
+        )
+        for filename in ("test.bin", "test.json"):
+            try:
+                data_frame.save(filename, codec="int16-lzma")
+                for lazy in (False, True):
+                    data_frame_2 = DataFrame.load(filename, lazy)
+                    self.assertEqual(data_frame_2.eeg_data.shape, (256, 5))
+                    error = np.abs(data_frame_2.eeg_data - self.eeg_data).max()
+                    self.assertLess(error, 0.01)
+                    timestamps = data_frame_2.eeg_timestamps
+                    self.assertTrue((timestamps == self.timestamps).all())
+            finally:
+                os.remove(filename)
+
+
+class TestExportWriter(unittest.TestCase):
+    """Test saving DataFrames in the background."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_submit(self):
+        """Test that snapshots of submitted DataFrames are saved on stop."""
+        eeg_data = np.random.rand(50, 4)
+        data_frame = DataFrame({}, eeg_data, {"start": None}, "meh", "1")
+        writer = ExportWriter(max_pending=2)
+        writer.start()
+        for index in range(5):
+            writer.submit(data_frame, os.path.join(self.directory.name, f"{index}.bin"))
+        eeg_data[:] = 0
+        writer.stop()
+
+        metrics = writer.get_metrics()
+        self.assertEqual(metrics["written"], 5)
+        self.assertEqual(metrics["pending"], 0)
+        self.assertLessEqual(metrics["max_pending"], 2)
+        saved = DataFrame.load(os.path.join(self.directory.name, "4.bin"))
+        self.assertTrue((saved.eeg_data != 0).any())
+
+    def test_error(self):
+        """Test that failed saves are reported."""
+        errors = []
+        writer = ExportWriter(on_error=lambda path, error: errors.append(path))
+        writer.start()
+        data_frame = DataFrame({}, np.zeros((1, 4)), {}, "meh", "1")
+        # Directory of the file is a regular file, so it can't be created.
+        blocker = os.path.join(self.directory.name, "blocker")
+        open(blocker, "w", encoding="utf-8").close()
+        writer.submit(data_frame, os.path.join(blocker, "data.json"))
+        writer.flush()
+        self.assertEqual(errors, [os.path.join(blocker, "data.json")])
+        self.assertEqual(writer.get_metrics()["failed"], 1)
+        writer.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for features.py module.
+"""
+
+import os
+import sys
+import time
+import unittest
+import threading
+
+import numpy as np
+
+# features.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import buffers  # noqa: E402
+from server import filters  # noqa: E402
+from server.features import BandPowerEngine, FeatureStage  # noqa: E402
+
+
+class TestBandPowerEngine(unittest.TestCase):
+    """Test BandPowerEngine class."""
+
+    def test_process(self):
+        """Test that features emitted every hop equal mean squared filtered
+        signal over the window, computed directly.
+        """
+        data = np.random.default_rng(0).normal(size=(2000, 3))
+        timestamps = np.arange(len(data), dtype=np.float64)
+        engine = BandPowerEngine(256, 3, window=1.0, hop=0.25)
+        received = []
+        engine.subscribe(received.append)
+
+        features = []
+        for start in range(0, len(data), 12):
+            end = start + 12
+            features += engine.process(data[start:end], timestamps[start:end])
+
+        squares = filters.FilterBank(256, 3).apply(data) ** 2
+        ends = range(256, len(data) + 1, 64)
+        self.assertEqual(len(features), len(ends))
+        self.assertEqual(received, features)
+        for feature, end in zip(features, ends):
+            expected = squares[end - 256 : end].mean(axis=0)
+            self.assertEqual(feature["timestamp"], end - 1)
+            self.assertEqual(feature["power"].shape, (5, 3))
+            np.testing.assert_allclose(feature["power"], expected, rtol=1e-9)
+        self.assertIs(engine.latest, features[-1])
+
+        engine.unsubscribe(received.append)
+        engine.process(data[:64], timestamps[:64] + len(data))
+        self.assertEqual(len(received), len(features))
+
+    def test_artifacts(self):
+        """Test that only windows containing an artifact sample are flagged,
+        and only for the channel of the artifact.
+        """
+        data = np.random.default_rng(1).normal(size=(3000, 2))
+        data[2000, 1] = 50.0
+        timestamps = np.arange(len(data), dtype=np.float64)
+        engine = BandPowerEngine(256, 2, window=1.0, hop=0.25, artifact_threshold=6)
+        features = []
+        for start in range(0, len(data), 12):
+            end = start + 12
+            features += engine.process(data[start:end], timestamps[start:end])
+
+        for feature in features:
+            contains = feature["timestamp"] - 256 < 2000 <= feature["timestamp"]
+            self.assertEqual(feature["artifact"].tolist(), [False, contains])
+        self.assertEqual(sum(feature["artifact"][1] for feature in features), 4)
+
+        engine = BandPowerEngine(256, 2, window=1.0, hop=0.25)
+        features = engine.process(data, timestamps)
+        self.assertFalse(any(feature["artifact"].any() for feature in features))
+
+    def test_invalid_hop(self):
+        """Test that hop longer than window is rejected."""
+        self.assertRaises(ValueError, BandPowerEngine, 256, 3, window=1.0, hop=2.0)
+
+
+class TestFeatureStage(unittest.TestCase):
+    """Test FeatureStage class."""
+
+    def test_run(self):
+        """Test that samples collected after the stage started are processed."""
+
+        class Collector:
+            lock = threading.Lock()
+            buffer = buffers.RingBuffer(1024, 2)
+
+            def get_index(self):
+                return self.buffer.written
+
+        collector = Collector()
+        collector.buffer.write(np.ones((100, 2)), np.arange(100.0))
+        engine = BandPowerEngine(256, 2, {"alpha": (8, 12)}, window=0.5, hop=0.25)
+        stage = FeatureStage(collector, engine, interval=0.01)
+        stage.start()
+        with collector.lock:
+            collector.buffer.write(np.ones((128, 2)), 100 + np.arange(128.0))
+        deadline = time.monotonic() + 5
+        while engine.latest is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stage.stop()
+
+        self.assertEqual(engine.latest["timestamp"], 227.0)
+        self.assertEqual(engine.latest["power"].shape, (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for filters.py module.
+"""
+
+import os
+import unittest
+import tempfile
+
+import numpy as np
+
+import filters
+from filters import BandPassFilter, MultiChannelFilter, FilterBank
+
+
+class TestMultiChannelFilter(unittest.TestCase):
+    """Test filtering all channels at once."""
+
+    def test_apply(self):
+        """Test that chunks are filtered like with a filter per channel."""
+        X = np.random.randn(300, 4)
+        filters = [BandPassFilter((8, 12), 256) for _ in range(4)]
+        multi_channel = MultiChannelFilter((8, 12), 256, 4)
+
+        for start in range(0, 300, 12):
+            chunk = X[start : start + 12]
+            expected = np.transpose(
+                [bandpass.apply(channel) for channel, bandpass in zip(chunk.T, filters)]
+            )
+            self.assertTrue(np.allclose(multi_channel.apply(chunk), expected))
+        self.assertEqual(multi_channel.apply([]).shape, (0, 4))
+
+    def test_filter_bank(self):
+        """Test filtering chunk with multiple bands."""
+        bank = FilterBank(256, 4, {"alpha": (8, 12), "beta": (12, 30)})
+        X = np.random.randn(24, 4)
+        Y = bank.apply(X)
+        self.assertEqual(Y.shape, (24, 2, 4))
+        self.assertEqual(bank.get_band_names(), ["alpha", "beta"])
+        alpha = MultiChannelFilter((8, 12), 256, 4).apply(X)
+        self.assertTrue(np.allclose(Y[:, 0], alpha))
+
+
+class TestDesignCache(unittest.TestCase):
+    """Test sharing and persisting filter designs."""
+
+    def tearDown(self):
+        filters._cache_file = None
+
+    def test_shared_design(self):
+        """Test that filters with the same parameters share coefficients."""
+        bandpass = BandPassFilter([8, 12], 256)
+        self.assertIs(bandpass.sos, MultiChannelFilter((8, 12), 256.0, 4).sos)
+        self.assertIsNot(bandpass.sos, BandPassFilter((8, 12), 256, 4).sos)
+
+        freq, db = bandpass.compute_frequency_response()
+        self.assertEqual(freq.shape, (64,))
+        self.assertEqual(db.shape, (64,))
+        self.assertIs(bandpass.compute_frequency_response()[1], db)
+
+    def test_cache_file(self):
+        """Test that designs are saved and loaded."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "filters.json")
+            filters.set_cache_file(path)
+            sos = filters.design(30, 256, 4, "lowpass")
+            self.assertTrue(os.path.exists(path))
+
+            del filters._designs[((30.0,), 256.0, 4, "lowpass")]
+            filters.set_cache_file(path)
+            loaded = filters._designs[((30.0,), 256.0, 4, "lowpass")]
+            self.assertIsNot(loaded, sos)
+            self.assertTrue(np.array_equal(loaded, sos))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for journal.py module.
+"""
+
+import unittest
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from buffers import RingBuffer
+from journal import Journal, JournalWriter, read_journal, recover
+
+
+class Collector:
+    """Minimal collector providing buffers and lock."""
+
+    def __init__(self):
+        self.buffers = {"EEG": RingBuffer(100, 4), "PPG": RingBuffer(100, 3)}
+        self.lock = threading.Lock()
+
+    def write(self, start, count):
+        timestamps = np.arange(start, start + count, dtype=np.float64)
+        for buffer in self.buffers.values():
+            data = np.repeat(timestamps[:, None], buffer.channels, axis=1)
+            buffer.write(data, timestamps)
+
+
+class TestJournal(unittest.TestCase):
+    """Test Journal and recovery of playback items."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "session.journal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def event(self, event_type, stream_time, **fields):
+        timestamp = datetime.fromtimestamp(1000 + stream_time)
+        return dict(
+            type=event_type, timestamp=timestamp, stream_time=stream_time, **fields
+        )
+
+    def test_recover(self):
+        """Test recovering finished and unfinished playback items."""
+        collector = Collector()
+        journal = Journal(self.path)
+        writer = JournalWriter(journal, collector)
+        journal.append_event({"type": "session", "userid": 1, "deviceid": "muse"})
+        journal.append_event(self.event("start", 10, playback={"uri": "a"}))
+        collector.write(0, 30)
+        writer.write()
+        journal.append_event(self.event("label", 15, label="like"))
+        journal.append_event(self.event("end", 20))
+        journal.append_event(self.event("start", 20, playback={"uri": "b"}))
+        collector.write(30, 10)
+        writer.write()
+        journal.close()
+
+        items = recover(self.path)
+        self.assertEqual(len(items), 2)
+        self.assertEqual(items[0]["label"], "like")
+        self.assertEqual(items[0]["deviceid"], "muse")
+        data, timestamps = items[0]["eeg"]
+        self.assertTrue((timestamps == np.arange(10, 20)).all())
+        self.assertEqual(data.shape, (10, 4))
+        self.assertEqual(items[0]["sensors"]["PPG"][0].shape, (10, 3))
+        self.assertIsNone(items[1]["markers"]["end"])
+        self.assertTrue((items[1]["eeg"][1] == np.arange(20, 40)).all())
+
+    def test_torn_record(self):
+        """Test that incomplete record at the end of journal is ignored."""
+        journal = Journal(self.path)
+        journal.append_chunk("EEG", np.zeros((5, 4)), np.arange(5.0))
+        journal.append_chunk("EEG", np.zeros((5, 4)), np.arange(5.0, 10.0))
+        journal.close()
+        with open(self.path, "r+b") as journal_file:
+            journal_file.truncate(os.path.getsize(self.path) - 3)
+        self.assertEqual(len(list(read_journal(self.path))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
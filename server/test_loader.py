@@ -0,0 +1,79 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for data/loader.py module.
+"""
+
+import os
+import sys
+import time
+import random
+import unittest
+import threading
+
+# loader.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server.data.loader import prefetch  # noqa: E402
+
+
+class TestPrefetch(unittest.TestCase):
+    """Test prefetch generator."""
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.loaded = []
+        self.sized = []
+
+    def load(self, item):
+        time.sleep(random.uniform(0, 0.01))
+        with self.lock:
+            self.loaded.append(item)
+        return item * 10
+
+    def size(self, item):
+        self.sized.append(item)
+        return 1
+
+    def test_order(self):
+        """Test that items are yielded in order, regardless of load times."""
+        random.seed(0)
+        items = list(range(30))
+        result = list(prefetch(items, self.load, self.size, workers=8, max_bytes=5))
+        self.assertEqual(result, [item * 10 for item in items])
+        self.assertEqual(self.sized, items)
+
+    def test_memory_budget(self):
+        """Test that items loaded ahead of consumer never exceed the budget."""
+        consumed = 0
+        ahead = []
+        for _ in prefetch(range(20), self.load, self.size, workers=8, max_bytes=3):
+            consumed += 1
+            time.sleep(0.02)
+            with self.lock:
+                ahead.append(len(self.loaded) - consumed)
+        self.assertLessEqual(max(ahead), 3 - 1)
+        self.assertEqual(consumed, 20)
+
+    def test_item_over_budget(self):
+        """Test that item larger than the budget is still loaded, on its own."""
+        result = prefetch(range(5), self.load, lambda item: 10, max_bytes=3)
+        self.assertEqual(list(result), [0, 10, 20, 30, 40])
+
+    def test_close(self):
+        """Test that closing the generator early cancels pending loads."""
+
+        def load(item):
+            time.sleep(0.05)
+            return self.load(item)
+
+        generator = prefetch(range(10), load, self.size, workers=1, max_bytes=5)
+        self.assertEqual(next(generator), 0)
+        generator.close()
+        loaded = len(self.loaded)
+        self.assertLess(loaded, 10)
+        time.sleep(0.2)
+        self.assertEqual(len(self.loaded), loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
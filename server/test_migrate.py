@@ -0,0 +1,118 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for data/migrate.py module, using the legacy recording kept
+    in the data directory.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+# migrate.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import exporter  # noqa: E402
+from server.data import migrate  # noqa: E402
+
+
+LEGACY_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "data",
+    "2021-09-07 11:00:45.968636.json",
+)
+
+
+class TestMigrate(unittest.TestCase):
+    """Test converting legacy JSON recordings to the binary format."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self.directory.name, "source")
+        self.output_dir = os.path.join(self.directory.name, "output")
+        os.makedirs(self.source_dir)
+        self.source = os.path.join(self.source_dir, "legacy.json")
+        self.output = os.path.join(self.output_dir, "legacy.bin")
+        shutil.copy(LEGACY_FILE, self.source)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def manifest(self):
+        path = os.path.join(self.output_dir, migrate.MANIFEST_FILE)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_convert_verify(self):
+        """Test that converted file holds the same samples and metadata."""
+        os.makedirs(self.output_dir)
+        for codec in ("none", "int16-zlib"):
+            result = migrate.convert((self.source, self.output, codec, None))
+            self.assertEqual(result["status"], "converted")
+            self.assertTrue(exporter.is_binary(self.output))
+
+            source = exporter.DataFrame.load(self.source)
+            converted = exporter.DataFrame.load(self.output)
+            self.assertEqual(migrate.verify(source, converted, codec), [])
+            converted.label = "like"
+            converted.eeg_data = converted.eeg_data + 1.0
+            differences = migrate.verify(source, converted, codec)
+            self.assertEqual(differences, ["label", "eeg_data"])
+
+    def test_skip_converted(self):
+        """Test that files are converted again only when their content or
+        codec has changed.
+        """
+        results = migrate.migrate(self.source_dir, self.output_dir, workers=1)
+        self.assertEqual([result["status"] for result in results], ["converted"])
+        manifest = self.manifest()
+        self.assertEqual(manifest["legacy.json"]["output"], "legacy.bin")
+        self.assertEqual(manifest["legacy.json"]["hash"], results[0]["hash"])
+
+        results = migrate.migrate(self.source_dir, self.output_dir, workers=1)
+        self.assertEqual([result["status"] for result in results], ["skipped"])
+
+        with open(self.source, "a", encoding="utf-8") as f:
+            f.write("\n")
+        results = migrate.migrate(self.source_dir, self.output_dir, workers=1)
+        self.assertEqual([result["status"] for result in results], ["converted"])
+
+        results = migrate.migrate(
+            self.source_dir, self.output_dir, "delta-zlib", workers=1
+        )
+        self.assertEqual([result["status"] for result in results], ["converted"])
+        self.assertEqual(self.manifest()["legacy.json"]["codec"], "delta-zlib")
+
+    def test_failed(self):
+        """Test that failed conversions are reported and their output removed."""
+        corrupt = os.path.join(self.source_dir, "corrupt.json")
+        with open(corrupt, "w", encoding="utf-8") as f:
+            f.write('{"userid": 0, "eeg": "')
+        results = migrate.migrate(self.source_dir, self.output_dir, workers=1)
+        self.assertEqual(
+            [(result["source"], result["status"]) for result in results],
+            [(corrupt, "failed"), (self.source, "converted")],
+        )
+        self.assertIn("error", results[0])
+        self.assertNotIn("corrupt.json", self.manifest())
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "corrupt.bin")))
+
+        with mock.patch.object(migrate, "verify", return_value=["eeg_data"]):
+            result = migrate.convert((self.source, self.output, "none", None))
+        self.assertEqual(result["status"], "failed")
+        self.assertIn("eeg_data", result["error"])
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_same_directory(self):
+        """Test that source directory is not accepted as output directory."""
+        for output_dir in (self.source_dir, os.path.join(self.source_dir, ".")):
+            with self.assertRaises(ValueError):
+                migrate.migrate(self.source_dir, output_dir)
+        self.assertEqual(os.listdir(self.source_dir), ["legacy.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for muse.py module, using local LSL outlets in place of Muse.
+"""
+
+import os
+import sys
+import time
+import unittest
+import threading
+from unittest import mock
+
+import numpy as np
+import pylsl
+
+# muse.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import muse  # noqa: E402
+from server import buffers  # noqa: E402
+
+
+def create_outlet(address, channels=2):
+    """Create EEG outlet with the source_id muselsl assigns to given Muse."""
+    info = pylsl.StreamInfo(
+        "Muse", "EEG", channels, 256, "float32", muse.get_source_id(address)
+    )
+    return pylsl.StreamOutlet(info)
+
+
+class TestCollectProcess(unittest.TestCase):
+    """Test collection loop of ProcessDataCollector."""
+
+    def test_collects_own_device(self):
+        """Test that with two headsets streaming, samples of the device that
+        buffer belongs to are collected.
+        """
+        outlets = {1.0: create_outlet("00:00:01"), 2.0: create_outlet("00:00:02")}
+        buffer = buffers.SharedRingBuffer(
+            1024, 2, reserve_size=muse.DataCollector.MAX_CHUNK_SIZE
+        )
+        source_id = muse.get_source_id("00:00:02")
+        specs = [("EEG", buffer.name, buffer.capacity, 2, source_id, None)]
+        stop = threading.Event()
+        collector = threading.Thread(
+            target=muse.DataCollector_collect_process, args=(specs, stop)
+        )
+        collector.start()
+        try:
+            deadline = time.monotonic() + 10
+            while buffer.written < 100 and time.monotonic() < deadline:
+                for value, outlet in outlets.items():
+                    outlet.push_chunk(np.full((12, 2), value, np.float32).tolist())
+                time.sleep(0.01)
+        finally:
+            stop.set()
+            collector.join()
+
+        data, _ = buffer.read()
+        self.assertGreaterEqual(len(data), 100)
+        self.assertTrue(np.all(data == 2.0))
+        buffer.close()
+        buffer.unlink()
+
+    def test_lost_source(self):
+        """Test that stream which source was lost is resolved again."""
+
+        class LostInlet:
+            def pull_chunk_into(self, data, timestamps, timeout):
+                raise muse.LostError("lost")
+
+        class Inlet:
+            pulled = False
+
+            def pull_chunk_into(self, data, timestamps, timeout):
+                if self.pulled:
+                    return 0
+                self.pulled = True
+                data[:5] = 3.0
+                timestamps[:5] = np.arange(5.0)
+                return 5
+
+        buffer = buffers.SharedRingBuffer(
+            64, 2, reserve_size=muse.DataCollector.MAX_CHUNK_SIZE
+        )
+        specs = [("EEG", buffer.name, buffer.capacity, 2, "MuseAA", None)]
+        stop = threading.Event()
+        inlets = [LostInlet(), Inlet()]
+        with mock.patch.object(muse, "find_lsl_stream", side_effect=inlets):
+            collector = threading.Thread(
+                target=muse.DataCollector_collect_process, args=(specs, stop)
+            )
+            collector.start()
+            deadline = time.monotonic() + 5
+            while buffer.written < 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            stop.set()
+            collector.join()
+
+        data, timestamps = buffer.read()
+        self.assertTrue((timestamps == np.arange(5.0)).all())
+        self.assertTrue((data == 3.0).all())
+        buffer.close()
+        buffer.unlink()
+
+    def test_watchdog_restarts_process(self):
+        """Test that collection process which has exited is restarted."""
+        collector = mock.Mock()
+        collector.buffer = buffers.RingBuffer(10, 2)
+        collector.stop_event = threading.Event()
+        collector.process.is_alive.return_value = False
+        watchdog = muse.ProcessWatchdog(collector)
+        watchdog.check()
+        collector._start_process.assert_called_once()
+
+        collector.stop_event.set()
+        watchdog.check()
+        collector._start_process.assert_called_once()
+
+    def test_watchdog_restarts_in_background(self):
+        """Test that stalled stream is restarted without blocking check()."""
+        restarted = threading.Event()
+        stream = mock.Mock(**{"restart.side_effect": restarted.wait})
+        watchdog = muse.StreamWatchdog(stream, buffers.RingBuffer(10, 2))
+        watchdog.last_progress -= muse.StreamWatchdog.STALL_TIMEOUT
+
+        start = time.monotonic()
+        self.assertFalse(watchdog.check())
+        self.assertFalse(watchdog.check())
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertTrue(watchdog.is_restarting())
+
+        restarted.set()
+        watchdog.restarter.join(5)
+        self.assertTrue(watchdog.check())
+        self.assertEqual(watchdog.restarts, 1)
+        stream.restart.assert_called_once()
+
+
+class TestStream(unittest.TestCase):
+    """Test connecting Stream to LSL streams."""
+
+    def test_find_inlet(self):
+        """Test that stream of another Muse is never connected to."""
+        outlet = create_outlet("00:00:03")
+        stream = muse.Stream("00:00:04")
+        start = time.monotonic()
+        self.assertIsNone(stream._find_inlet("EEG"))
+        self.assertLess(time.monotonic() - start, 2 * muse.RECONNECT_TIMEOUT + 1)
+
+        stream = muse.Stream("00:00:03")
+        inlet = stream._find_inlet("EEG")
+        self.assertEqual(inlet.info().source_id(), muse.get_source_id("00:00:03"))
+        inlet.close_stream()
+        del outlet
+
+    def test_connect_not_ready(self):
+        """Test that nothing is resolved when stream process is not ready."""
+        stream = muse.Stream("00:00:05")
+        stream.ready = threading.Event()
+        with mock.patch.object(muse, "STREAM_START_TIMEOUT", 0.1):
+            with mock.patch.object(muse, "find_lsl_stream") as find_lsl_stream:
+                stream._connect()
+        find_lsl_stream.assert_not_called()
+        self.assertEqual(stream.inlets, {})
+
+    def test_start_without_waiting(self):
+        """Test that inlets are connected in the background once the stream
+        process is ready.
+        """
+        stream = muse.Stream("00:00:06")
+        inlet = mock.Mock()
+        inlet.info.return_value.source_id.return_value = "Muse00:00:06"
+
+        def start_stream_process():
+            stream.process = mock.Mock(**{"is_alive.return_value": True})
+            stream.ready = threading.Event()
+
+        with mock.patch.object(stream, "_start_stream_process", start_stream_process):
+            with mock.patch.object(stream, "_find_inlet", return_value=inlet):
+                self.assertFalse(stream.start(wait=False))
+                self.assertTrue(stream.is_connecting())
+                self.assertFalse(stream.is_running())
+                stream.ready.set()
+                stream.connector.join(5)
+
+        self.assertFalse(stream.is_connecting())
+        self.assertTrue(stream.is_running())
+        self.assertIs(stream.inlet, inlet)
+
+    def test_restart_stopped(self):
+        """Test that stream stopped before a pending restart stays stopped."""
+        stream = muse.Stream("00:00:07")
+        with mock.patch.object(stream, "_start_stream_process") as start:
+            self.assertFalse(stream.restart())
+        start.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
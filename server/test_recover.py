@@ -0,0 +1,72 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for recover.py module.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+# recover.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import exporter  # noqa: E402
+from server import journal  # noqa: E402
+from server.recover import recover_journal  # noqa: E402
+
+
+class TestRecover(unittest.TestCase):
+    """Test recovering DataFrame files from a session journal."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "session.journal")
+        session_journal = journal.Journal(self.path)
+        session_journal.append_event({"type": "session", "userid": 1, "deviceid": "a"})
+        session_journal.append_event(self.event("start", 10, playback={"uri": "a"}))
+        session_journal.append_chunk("EEG", np.ones((30, 4)), np.arange(30.0))
+        session_journal.append_event(self.event("end", 20))
+        session_journal.append_event(self.event("start", 20, playback={"uri": "b"}))
+        session_journal.append_chunk("EEG", np.ones((10, 4)), np.arange(30.0, 40.0))
+        session_journal.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def event(self, event_type, stream_time, **fields):
+        timestamp = datetime.fromtimestamp(1000 + stream_time)
+        return dict(
+            type=event_type, timestamp=timestamp, stream_time=stream_time, **fields
+        )
+
+    def output(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_recover(self):
+        """Test that finished and unfinished items are recovered once."""
+        change = datetime.fromtimestamp(1020)
+        created = recover_journal(self.path, self.directory.name, "binary")
+        self.assertEqual(
+            created,
+            [self.output(f"{change}_a.bin"), self.output(f"{change}_a_unfinished.bin")],
+        )
+        data_frame = exporter.DataFrame.load(created[1])
+        self.assertEqual(data_frame.playback_info, {"uri": "b"})
+        self.assertTrue((data_frame.eeg_timestamps == np.arange(20, 40)).all())
+        self.assertEqual(recover_journal(self.path, self.directory.name), [])
+
+    def test_skip_exported(self):
+        """Test that item exported by the session in another format is skipped."""
+        change = datetime.fromtimestamp(1020)
+        with open(self.output(f"{change}_a.bin"), "wb"):
+            pass
+        created = recover_journal(self.path, self.directory.name, "json")
+        self.assertEqual(created, [self.output(f"{change}_a_unfinished.json")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for session.py module, using collector fed with synthetic samples.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+# session.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import buffers  # noqa: E402
+from server import muse  # noqa: E402
+
+try:
+    from server import configuration  # noqa: E402
+    from server import session  # noqa: E402
+except (ModuleNotFoundError, FileNotFoundError):
+    # configuration.py requires server/secret.py and configuration files,
+    # which are not distributed.
+    session = None
+
+
+class Collector(muse.BufferReader):
+    """Collector with EEG and PPG buffers sampled at 10 Hz, timestamped with
+    stream time in seconds.
+    """
+
+    clock_offset = 0.0
+
+    def __init__(self):
+        self.buffers = {
+            "EEG": buffers.RingBuffer(1000, 2),
+            "PPG": buffers.RingBuffer(1000, 1),
+        }
+        self.lock = threading.Lock()
+        self.stream = mock.Mock(**{"get_sampling_rate.return_value": 10})
+        self.cleared = 0
+
+    def clear(self):
+        self.cleared += 1
+        super().clear()
+
+    def write(self, count):
+        first = self.buffer.written
+        timestamps = np.arange(first, first + count) / 10
+        for buffer in self.buffers.values():
+            data = np.repeat(timestamps[:, None], buffer.channels, axis=1)
+            buffer.write(data, timestamps)
+
+
+@unittest.skipIf(session is None, "configuration is not available.")
+class TestSession(unittest.TestCase):
+    """Test segmentation of collected data into playback items."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = configuration.app
+        configuration.app = configuration.App()
+        configuration.app.set_session_data_dir(self.directory.name)
+        configuration.app.set_catalog(False)
+        configuration.app.set_journal_interval(0)
+        self.collector = Collector()
+
+    def tearDown(self):
+        configuration.app = self.app
+        self.directory.cleanup()
+
+    def play(self, continuous):
+        """Play three items, changed at 0.5, 1.5 and 2.5 seconds, return
+        data frames queued for export.
+        """
+        data_session = session.Session(self.collector, continuous)
+        self.collector.write(10)
+        data_session.on_playback_started({"uri": "a"}, 0.5)
+        self.collector.write(10)
+        data_session.on_playback_next({"uri": "a"}, {"uri": "b"}, 1.5)
+        self.collector.write(10)
+        data_session.on_playback_next({"uri": "b"}, {"uri": "c"}, 2.5)
+        queue = data_session.writer.queue
+        return [queue.get_nowait()[0] for _ in range(queue.qsize())]
+
+    def test_continuous(self):
+        """Test that consecutive items get adjacent, non-overlapping segments
+        of the buffer, which is never cleared.
+        """
+        first, second = self.play(continuous=True)
+        self.assertEqual(self.collector.cleared, 0)
+        np.testing.assert_array_equal(first.eeg_timestamps, np.arange(5, 15) / 10)
+        np.testing.assert_array_equal(second.eeg_timestamps, np.arange(15, 25) / 10)
+        np.testing.assert_allclose(first.eeg_data[:, 0], first.eeg_timestamps, 1e-6)
+        self.assertEqual(first.playback_info, {"uri": "a"})
+        self.assertEqual(second.playback_info, {"uri": "b"})
+
+    def test_not_continuous(self):
+        """Test that collector is cleared on every playback change, dropping
+        samples collected before the change.
+        """
+        first, second = self.play(continuous=False)
+        self.assertEqual(self.collector.cleared, 4)
+        np.testing.assert_array_equal(first.eeg_timestamps, np.arange(10, 15) / 10)
+        np.testing.assert_array_equal(second.eeg_timestamps, np.arange(20, 25) / 10)
+
+    def test_sensors(self):
+        """Test that sensor samples cover the same period as EEG samples."""
+        for continuous in (True, False):
+            self.collector = Collector()
+            for data_frame in self.play(continuous):
+                ppg_data, ppg_timestamps = data_frame.sensors["PPG"]
+                eeg_timestamps = data_frame.eeg_timestamps
+                np.testing.assert_array_equal(ppg_timestamps, eeg_timestamps)
+                self.assertEqual(ppg_data.shape, (len(eeg_timestamps), 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
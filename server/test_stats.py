@@ -0,0 +1,93 @@
+""" 2021 Created by michal@buyuk-dev.com
+
+    Unit tests for data/stats.py module and metadata parsing it relies on.
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime
+
+import numpy as np
+
+# stats.py imports other modules of the server package, which can only be
+# imported as a package from the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from server import exporter  # noqa: E402
+from server.data import stats  # noqa: E402
+
+
+class TestStats(unittest.TestCase):
+    """Test reading metadata and summarizing DataFrame files."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def save(self, name, playback=None, fmt=None):
+        timestamps = {
+            "start": datetime(2021, 9, 7, 10, 0, 0),
+            "end": datetime(2021, 9, 7, 10, 1, 30),
+            "labeling": None,
+        }
+        data_frame = exporter.DataFrame(
+            playback or {"artists": "A"}, np.zeros((30, 5)), timestamps, "like", 1
+        )
+        path = os.path.join(self.directory.name, name)
+        data_frame.save(path, fmt)
+        return path
+
+    def test_entries_split_across_reads(self):
+        """Test parsing entries split between blocks read from the file."""
+        # Artists of the long file cross the boundary of default READ_SIZE.
+        for name, artists in (("long.json", "A" * 70000), ("short.json", "A")):
+            path = self.save(name, {"artists": artists, "song": "\\ \" 1.5"})
+            with open(path, "r", encoding="utf-8") as f:
+                expected = json.load(f)
+            del expected["eeg"]
+            self.assertEqual(exporter.read_json_metadata(path), expected)
+
+        for read_size in (1, 7, 64):
+            with mock.patch.object(exporter, "READ_SIZE", read_size):
+                self.assertEqual(exporter.read_json_metadata(path), expected)
+
+    def test_summarize_legacy(self):
+        """Test legacy json file, without shape of eeg data."""
+        path = os.path.join(self.directory.name, "legacy.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                '{"userid": 0, "playback": {"artists": "B"}, "label": "meh", '
+                '"timestamps": {"start": "2021-09-07T10:59:29", '
+                '"end": "2021-09-07T11:00:29", "labeling": null}, "eeg": "gASV'
+            )
+        summary = stats.summarize(path)
+        self.assertEqual(summary["artist"], "B")
+        self.assertEqual(summary["duration"], 60.0)
+        self.assertIsNone(summary["samples"])
+
+    def test_summarize(self):
+        """Test json file with shape of eeg data, and binary file header."""
+        for name in ("a.json", "b.bin"):
+            summary = stats.summarize(self.save(name))
+            self.assertEqual(summary["label"], "like")
+            self.assertEqual(summary["duration"], 90.0)
+            self.assertEqual(summary["samples"], 30)
+
+    def test_invalid(self):
+        """Test that invalid files are reported as errors."""
+        path = os.path.join(self.directory.name, "invalid.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('["userid", 0]')
+        self.assertIn("error", stats.summarize(path))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"userid": 0, "label": "like"')
+        self.assertIn("error", stats.summarize(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,11 @@
 import unittest
 import time
 
-from utils import StoppableThread
+import numpy
+from scipy import signal
+
+from utils import StoppableThread, SpectrumEstimator
+from utils import ChunkStats, WindowedChunkStats, ExponentialChunkStats
 
 
 class TestStoppableThread(unittest.TestCase):
@@ -34,5 +38,83 @@ class TestStoppableThread(unittest.TestCase):
         self.assertEqual(thread.counter, 2)
 
 
+class TestSpectrumEstimator(unittest.TestCase):
+    """Unit test for SpectrumEstimator class."""
+
+    def test_matches_welch(self):
+        """Test that spectrum of chunks equals Welch estimate of the signal."""
+        fs = 256
+        data = numpy.random.default_rng(0).normal(size=(10 * fs, 3))
+        estimator = SpectrumEstimator(fs, 3, window=10.0, cutoff=35)
+        for start in range(0, len(data), 12):
+            estimator.push(data[start : start + 12])
+        freq, amplitude = estimator.spectrum()
+
+        expected_freq, power = signal.welch(
+            data, fs, nperseg=512, detrend=False, scaling="spectrum", axis=0
+        )
+        index = numpy.searchsorted(expected_freq, 35)
+        numpy.testing.assert_allclose(freq, expected_freq[1:index])
+        numpy.testing.assert_allclose(2 * amplitude**2, power[1:index])
+
+    def test_averages_last_window(self):
+        """Test that only segments of the last window are averaged."""
+        fs = 128
+        ts = numpy.arange(20 * fs) / fs
+        data = numpy.concatenate(
+            (numpy.sin(2 * numpy.pi * 5 * ts), numpy.sin(2 * numpy.pi * 10 * ts))
+        )
+        estimator = SpectrumEstimator(fs, 1, window=4.0)
+        self.assertEqual(estimator.spectrum()[1].shape, (len(estimator.freq), 1))
+        estimator.push(data)
+        freq, amplitude = estimator.spectrum()
+        self.assertEqual(freq[numpy.argmax(amplitude[:, 0])], 10.0)
+
+
+class TestChunkStats(unittest.TestCase):
+    """Unit tests for ChunkStats classes."""
+
+    def setUp(self):
+        self.data = numpy.random.default_rng(0).normal(5.0, 2.0, size=(1000, 3))
+        self.chunks = numpy.split(self.data, [1, 8, 21, 271, 274, 364, 514])
+
+    def test_chunk_stats(self):
+        """Test that merged chunks give statistics of all samples."""
+        stats = ChunkStats(3)
+        for chunk in self.chunks:
+            stats.push(chunk)
+        numpy.testing.assert_allclose(stats.mean(), self.data.mean(axis=0))
+        numpy.testing.assert_allclose(stats.variance(), self.data.var(axis=0, ddof=1))
+
+    def test_windowed_chunk_stats(self):
+        """Test statistics of the last window samples after every chunk."""
+        stats = WindowedChunkStats(3, 100)
+        end = 0
+        for chunk in self.chunks:
+            stats.push(chunk)
+            end += len(chunk)
+            window = self.data[max(0, end - 100) : end]
+            numpy.testing.assert_allclose(stats.mean(), window.mean(axis=0))
+            if len(window) > 1:
+                numpy.testing.assert_allclose(
+                    stats.variance(), window.var(axis=0, ddof=1)
+                )
+
+    def test_exponential_chunk_stats(self):
+        """Test that chunks give the same result as sample by sample updates."""
+        stats = ExponentialChunkStats(3, 0.05)
+        for chunk in self.chunks:
+            stats.push(chunk)
+
+        mean = self.data[0].copy()
+        variance = numpy.zeros(3)
+        for sample in self.data[1:]:
+            delta = sample - mean
+            mean += 0.05 * delta
+            variance = 0.95 * (variance + 0.05 * delta**2)
+        numpy.testing.assert_allclose(stats.mean(), mean)
+        numpy.testing.assert_allclose(stats.variance(), variance)
+
+
 if __name__ == "__main__":
     unittest.main()
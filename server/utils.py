@@ -2,9 +2,9 @@
 """
 
 import threading
-import math
 
 import numpy
+from scipy import signal
 from matplotlib import pyplot
 
 
@@ -23,6 +23,73 @@ def compute_spectrum(X, fs, cutoff=numpy.inf):
     return freq[1:], fft[1:]
 
 
+class SpectrumEstimator:
+    """Streaming Welch estimate of amplitude spectrum of multichannel signal.
+
+    Signal is split into overlapping segments, spectrum of every segment is
+    computed once when the segment is complete, and spectra of the last
+    segments covering window seconds are averaged.
+    """
+
+    def __init__(
+        self, fs, channels, window=10.0, segment=2.0, overlap=0.5, cutoff=numpy.inf
+    ):
+        """fs: sampling rate in Hz.
+        window, segment: length of averaged signal and of segments, in seconds.
+        overlap: fraction of segment shared by consecutive segments.
+        cutoff: frequencies from cutoff up are dropped.
+        """
+        self.channels = channels
+        self.size = int(round(segment * fs))
+        self.step = max(1, int(round(self.size * (1 - overlap))))
+        self.taper = signal.get_window("hann", self.size)[:, numpy.newaxis]
+        self.scale = 1.0 / self.taper.sum()
+
+        freq = numpy.fft.rfftfreq(self.size, 1.0 / fs)
+        self.index = numpy.searchsorted(freq, cutoff)
+        self.freq = freq[1 : self.index]
+
+        count = max(1, int(round((window * fs - self.size) / self.step)) + 1)
+        self.powers = numpy.zeros((count, len(self.freq), channels))
+        self.segments = 0
+        self.pending = numpy.zeros((0, channels))
+        self.amplitude = numpy.zeros((len(self.freq), channels))
+        self.updated = True
+
+    def push(self, samples):
+        """Add chunk of samples of shape (samples, channels)."""
+        samples = numpy.asarray(samples, dtype=numpy.float64)
+        samples = samples.reshape(-1, self.channels)
+        self.pending = numpy.concatenate((self.pending, samples))
+        if len(self.pending) < self.size:
+            return
+
+        count = (len(self.pending) - self.size) // self.step + 1
+        starts = numpy.arange(count) * self.step
+        segments = self.pending[starts[:, numpy.newaxis] + numpy.arange(self.size)]
+        spectra = numpy.fft.rfft(segments * self.taper, axis=1)[:, 1 : self.index]
+        self.pending = self.pending[count * self.step :]
+
+        # Only spectra of the last segments fit in the average.
+        powers = (numpy.abs(spectra) * self.scale) ** 2
+        powers = powers[-len(self.powers) :]
+        first = self.segments + count - len(powers)
+        slots = numpy.arange(first, first + len(powers)) % len(self.powers)
+        self.powers[slots] = powers
+        self.segments += count
+        self.updated = False
+
+    def spectrum(self):
+        """Return frequencies and average amplitude spectrum of shape
+        (frequencies, channels), zero until the first segment is complete.
+        """
+        if not self.updated:
+            filled = min(self.segments, len(self.powers))
+            self.amplitude = numpy.sqrt(self.powers[:filled].mean(axis=0))
+            self.updated = True
+        return self.freq, self.amplitude
+
+
 def generate_complex_signal(freqs, amps, duration, fs):
     """Generate complex signal that is a sum of sine waves with
     given set of frequencies and amplitudes.
@@ -39,42 +106,155 @@ def plot(data, title):
     pyplot.show()
 
 
-class RunningStats:
-    """Imprementation found on StackOverflow and copied from:
-    https://github.com/liyanage/python-modules/blob/master/running_stats.py
+class ChunkStats:
+    """Running mean and variance of every channel of a multichannel signal,
+    updated with whole chunks of samples of shape (samples, channels).
+    Chunk statistics are merged with Chan et al. parallel algorithm.
     """
 
-    def __init__(self):
-        self.n = 0
-        self.old_m = 0
-        self.new_m = 0
-        self.old_s = 0
-        self.new_s = 0
+    def __init__(self, channels):
+        """Initialize empty statistics."""
+        self.channels = channels
+        self.clear()
 
     def clear(self):
+        """Forget all samples."""
         self.n = 0
+        self.m = numpy.zeros(self.channels)
+        self.s = numpy.zeros(self.channels)
 
-    def push(self, x):
-        self.n += 1
+    def _chunk(self, x):
+        """Return chunk as array, its size, mean and sum of squared deviations."""
+        x = numpy.asarray(x, dtype=numpy.float64).reshape(-1, self.channels)
+        m = x.mean(axis=0) if len(x) else numpy.zeros(self.channels)
+        return x, len(x), m, ((x - m) ** 2).sum(axis=0)
 
-        if self.n == 1:
-            self.old_m = self.new_m = x
-            self.old_s = 0
-        else:
-            self.new_m = self.old_m + (x - self.old_m) / self.n
-            self.new_s = self.old_s + (x - self.old_m) * (x - self.new_m)
+    def _merge(self, n, m, s):
+        """Merge statistics of a chunk of n samples into the running ones."""
+        if n == 0:
+            return
+        total = self.n + n
+        delta = m - self.m
+        self.s = self.s + s + delta**2 * self.n * n / total
+        self.m = self.m + delta * n / total
+        self.n = total
 
-            self.old_m = self.new_m
-            self.old_s = self.new_s
+    def push(self, x):
+        """Add chunk of shape (samples, channels)."""
+        _, n, m, s = self._chunk(x)
+        self._merge(n, m, s)
 
     def mean(self):
-        return self.new_m if self.n else 0.0
+        """Return mean of every channel."""
+        return self.m.copy()
 
     def variance(self):
-        return self.new_s / (self.n - 1) if self.n > 1 else 0.0
+        """Return sample variance of every channel."""
+        if self.n < 2:
+            return numpy.zeros(self.channels)
+        return self.s / (self.n - 1)
 
     def standard_deviation(self):
-        return math.sqrt(self.variance())
+        """Return standard deviation of every channel."""
+        return numpy.sqrt(self.variance())
+
+
+class WindowedChunkStats(ChunkStats):
+    """ChunkStats of the last window samples. Statistics of samples leaving
+    the window are subtracted, and recomputed from retained samples once per
+    window, so rounding errors don't accumulate.
+    """
+
+    def __init__(self, channels, window):
+        """Initialize empty statistics of the last window samples."""
+        self.window = window
+        self.samples = numpy.zeros((window, channels))
+        super().__init__(channels)
+
+    def clear(self):
+        """Forget all samples."""
+        super().clear()
+        self.written = 0
+
+    def _remove(self, n, m, s):
+        """Inverse of _merge(), subtract statistics of retained samples."""
+        if n >= self.n:
+            self.n = 0
+            self.m = numpy.zeros(self.channels)
+            self.s = numpy.zeros(self.channels)
+            return
+        rest = self.n - n
+        rest_m = (self.n * self.m - n * m) / rest
+        delta = m - rest_m
+        self.s = numpy.maximum(self.s - s - delta**2 * rest * n / self.n, 0.0)
+        self.m = rest_m
+        self.n = rest
+
+    def push(self, x):
+        """Add chunk of shape (samples, channels), dropping samples that
+        leave the window.
+        """
+        x, n, m, s = self._chunk(x)
+        if n == 0:
+            return
+        # Samples older than the window never enter it.
+        x = x[-self.window :]
+        previous = self.written
+        self.written += n - len(x)
+
+        dropped = max(0, self.n + len(x) - self.window)
+        if dropped:
+            first = previous - self.n
+            indices = numpy.arange(first, first + dropped) % self.window
+            self._remove(*self._chunk(self.samples[indices])[1:])
+
+        indices = numpy.arange(self.written, self.written + len(x)) % self.window
+        self.samples[indices] = x
+        self._merge(*self._chunk(x)[1:])
+        self.written += len(x)
+
+        if previous // self.window != self.written // self.window:
+            retained = self.samples
+            if self.n < self.window:
+                first = self.written - self.n
+                retained = self.samples[numpy.arange(first, self.written) % self.window]
+            _, self.n, self.m, self.s = self._chunk(retained)
+
+
+class ExponentialChunkStats(ChunkStats):
+    """Exponentially weighted mean and variance, with weight alpha of the
+    newest sample. Gives the same result as updating them sample by sample:
+    mean += alpha * (x - mean), variance = (1 - alpha) * (variance + alpha *
+    (x - mean) ** 2), starting with the first sample as the mean.
+    """
+
+    def __init__(self, channels, alpha):
+        """Initialize empty statistics, alpha in range (0, 1]."""
+        if not 0 < alpha <= 1:
+            raise ValueError("Alpha must be in range (0, 1].")
+        self.alpha = alpha
+        super().__init__(channels)
+
+    def push(self, x):
+        """Add chunk of shape (samples, channels)."""
+        x, n, _, _ = self._chunk(x)
+        if n == 0:
+            return
+        decay = (1 - self.alpha) ** numpy.arange(n - 1, -1, -1)
+        weights = self.alpha * decay
+        previous = (1 - self.alpha) ** n
+        if self.n == 0:
+            weights[0] = decay[0]
+            previous = 0.0
+
+        m = previous * self.m + weights @ x
+        self.s = previous * (self.s + (self.m - m) ** 2) + weights @ ((x - m) ** 2)
+        self.m = m
+        self.n += n
+
+    def variance(self):
+        """Return exponentially weighted variance of every channel."""
+        return self.s.copy()
 
 
 class StoppableThread(threading.Thread):
@@ -12,6 +12,7 @@ rcParams["font.family"] = "monospace"
 import numpy as np
 
 from server import exporter
+from server import features
 
 
 def plot_data(data_frame):
@@ -79,18 +80,43 @@ def plot_data(data_frame):
     pyplot.show()
 
 
+def plot_band_powers(data_frame, sampling=256):
+    """Plot power of each band over time, on separate subplot for each channel."""
+    data = np.array(data_frame.eeg_data)
+    engine = features.BandPowerEngine(sampling, data.shape[1])
+    powers = []
+    engine.subscribe(powers.append)
+    engine.process(data, np.arange(len(data)) / sampling)
+
+    times = [feature["timestamp"] for feature in powers]
+    for i in range(data.shape[1]):
+        pyplot.subplot(data.shape[1], 1, i + 1)
+        for band, name in enumerate(engine.get_band_names()):
+            power = [feature["power"][band, i] for feature in powers]
+            pyplot.plot(times, power, label=name)
+        pyplot.yscale("log")
+        pyplot.xlabel("Time (s)")
+        pyplot.ylabel("Power")
+    pyplot.legend()
+    pyplot.show()
+
+
 def main():
     """Run viewer."""
     parser = argparse.ArgumentParser()
     parser.add_argument("path")
+    parser.add_argument("--bands", action="store_true", help="plot band powers")
 
     args = parser.parse_args()
 
     if not os.path.isfile(args.path):
         print(f"File {args.path} not found.")
 
-    data_frame = exporter.DataFrame.load(args.path)
-    plot_data(data_frame)
+    data_frame = exporter.DataFrame.load(args.path, lazy=True)
+    if args.bands:
+        plot_band_powers(data_frame)
+    else:
+        plot_data(data_frame)
 
 
 if __name__ == "__main__":